@@ -0,0 +1,371 @@
+"""
+本地 HTTP 接口：不启动图形界面，用 asyncio 在本机地址上提供区域查询、地名搜索、全文检索和 GeoJSON 几何。
+
+数据在启动时按 main_data_processing 的流程（含数据缓存）加载一次，此后只读。
+响应为 JSON（UTF-8），带强 ETag，支持 If-None-Match（304）、gzip 和 HTTP/1.1 长连接；生成过的响应按 URL 缓存。
+
+接口（GET / HEAD）：
+  /regions                       全部省级区域
+  /regions/{adcode}              区域详情：沿革文本及下级区域；?level=1|2|3 区分同一 adcode 的不同级别
+  /regions/{adcode}/children     下级区域
+  /regions/{adcode}/geometry     GeoJSON Feature；?detail=0~4 为几何金字塔级别（0 为原始几何）
+  /search?q=...&limit=N          地名搜索，按区域树先序排列
+  /fulltext?q=...&limit=N        沿革全文检索，按相关度排序，带上下文摘要
+
+用法: python main.py serve [--host 127.0.0.1] [--port 8765]
+      python api_server.py [...]
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import ipaddress
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import shapely
+
+from core import (
+    FULLTEXT_INDEX_PATH, PYRAMID_TOLERANCES, SHAPEFILE_PATHS, FullTextIndex, GeometryPyramid,
+    NameSearchIndex, ProcessedData, Region, get_geometry_pyramid, iter_regions, main_data_processing,
+)
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 1000
+API_GZIP_MIN_BYTES = 512          # 小于此大小的响应不压缩
+API_RESPONSE_CACHE_SIZE = 2048    # 最多缓存多少个 URL 的响应
+API_MAX_HEADER_BYTES = 16384
+API_KEEP_ALIVE_TIMEOUT = 15.0     # 长连接空闲多少秒后关闭
+HTTP_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 431: "Request Header Fields Too Large", 500: "Internal Server Error"}
+JSON_CONTENT_TYPE = "application/json; charset=utf-8"
+GEOJSON_CONTENT_TYPE = "application/geo+json; charset=utf-8"
+
+
+class ApiError(Exception):
+    """请求无法完成：带 HTTP 状态码的错误"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ApiResponse:
+    """生成好的响应：正文、强 ETag，以及按需压缩的 gzip 正文"""
+    __slots__ = ("status", "body", "content_type", "etag", "_gzip_body")
+
+    def __init__(self, status: int, body: bytes, content_type: str = JSON_CONTENT_TYPE):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._gzip_body: Optional[bytes] = None
+
+    @property
+    def gzip_etag(self) -> str:
+        """gzip 正文与原始正文字节不同，使用不同的强 ETag"""
+        return self.etag[:-1] + '-gzip"'
+
+    def gzip_body(self) -> bytes:
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzip_body
+
+
+def _json_bytes(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def region_summary(region: Region) -> Dict[str, Any]:
+    return {"adcode": region.adcode, "name": region.name, "level": region.level,
+            "parent_adcode": region.parent_adcode, "parent_name": region.parent_name,
+            "has_geometry": region.geometry is not None}
+
+
+def region_path(region: Region) -> List[str]:
+    """从省级到该区域的名称路径"""
+    names = []
+    while region is not None:
+        names.append(region.name)
+        region = region.parent
+    return names[::-1]
+
+
+class RegionApi:
+    """接口的查询逻辑，与 HTTP 无关；数据加载后只读，可在线程池中并发调用"""
+    def __init__(self, md_data: ProcessedData, name_index: NameSearchIndex, fulltext_index: FullTextIndex,
+                 pyramid: Optional[GeometryPyramid]):
+        self.md_data = md_data
+        self.name_index = name_index
+        self.fulltext_index = fulltext_index
+        self.pyramid = pyramid
+        # 同一 adcode 可能同时出现在市级和区县级（如省直辖县级市），按先序保存全部
+        self._by_adcode: Dict[str, List[Region]] = {}
+        for region in iter_regions(md_data):
+            if region.adcode is not None:
+                self._by_adcode.setdefault(str(region.adcode), []).append(region)
+
+    def respond(self, path: str, query: Dict[str, List[str]]) -> ApiResponse:
+        """处理一个 GET 请求；出错时返回带错误信息的 JSON"""
+        try:
+            return self._route(path, query)
+        except ApiError as e:
+            return ApiResponse(e.status, _json_bytes({"error": e.message}))
+        except Exception as e:
+            print(f"Error handling API request {path}: {e}")
+            return ApiResponse(500, _json_bytes({"error": "internal error"}))
+
+    def _route(self, path: str, query: Dict[str, List[str]]) -> ApiResponse:
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["regions"]:
+            return self._json({"regions": [region_summary(region) for region in self.md_data]})
+        if len(parts) in (2, 3) and parts[0] == "regions":
+            region = self.find_region(parts[1], self._int_param(query, "level", None, 1, 3))
+            if len(parts) == 2:
+                return self._json(self.region_detail(region))
+            if parts[2] == "children":
+                return self._json({"adcode": region.adcode, "name": region.name,
+                                   "children": [region_summary(child) for child in region.children]})
+            if parts[2] == "geometry":
+                detail = self._int_param(query, "detail", 0, 0, len(PYRAMID_TOLERANCES))
+                return ApiResponse(200, self.geometry_feature(region, detail), GEOJSON_CONTENT_TYPE)
+        if parts == ["search"]:
+            text = self._query_text(query)
+            results = self.name_index.search(text)
+            limit = self._int_param(query, "limit", API_DEFAULT_LIMIT, 1, API_MAX_LIMIT)
+            return self._json({"query": text, "total": len(results),
+                               "results": [region_summary(region) for region in results[:limit]]})
+        if parts == ["fulltext"]:
+            text = self._query_text(query)
+            hits = self.fulltext_index.search(text)
+            limit = self._int_param(query, "limit", API_DEFAULT_LIMIT, 1, API_MAX_LIMIT)
+            return self._json({"query": text, "total": len(hits),
+                               "results": [dict(region_summary(hit.region), score=round(hit.score, 4),
+                                                snippet=hit.snippet) for hit in hits[:limit]]})
+        raise ApiError(404, f"unknown endpoint: {path}")
+
+    def _json(self, payload: Any) -> ApiResponse:
+        return ApiResponse(200, _json_bytes(payload))
+
+    def _query_text(self, query: Dict[str, List[str]]) -> str:
+        text = query.get("q", [""])[0].strip()
+        if not text:
+            raise ApiError(400, "missing query parameter 'q'")
+        return text
+
+    def _int_param(self, query: Dict[str, List[str]], name: str, default: Optional[int],
+                   minimum: int, maximum: int) -> Optional[int]:
+        if name not in query:
+            return default
+        try:
+            value = int(query[name][0])
+        except ValueError:
+            raise ApiError(400, f"parameter '{name}' must be an integer")
+        if not minimum <= value <= maximum:
+            raise ApiError(400, f"parameter '{name}' must be between {minimum} and {maximum}")
+        return value
+
+    def find_region(self, adcode: str, level: Optional[int] = None) -> Region:
+        """按 adcode 查找区域；同一 adcode 有多个级别时默认取级别最高（最先出现）的一个"""
+        for region in self._by_adcode.get(adcode.strip(), ()):
+            if level is None or region.level == level:
+                return region
+        raise ApiError(404, f"no region with adcode {adcode}" + (f" at level {level}" if level else ""))
+
+    def region_detail(self, region: Region) -> Dict[str, Any]:
+        detail = region_summary(region)
+        detail.update(path=region_path(region), text_general=region.text_general, text_detail=region.text_detail,
+                      children=[region_summary(child) for child in region.children])
+        return detail
+
+    def geometry_feature(self, region: Region, detail: int) -> bytes:
+        """区域几何的 GeoJSON Feature；几何用 shapely 直接序列化，再拼入属性"""
+        geometry = region.geometry
+        if detail > 0 and self.pyramid is not None:
+            geometry = self.pyramid.region_geometry(region, detail)
+        if geometry is None:
+            raise ApiError(404, f"region {region.adcode} has no geometry")
+        properties = dict(region_summary(region), detail=detail)
+        return (b'{"type":"Feature","id":' + _json_bytes(region.adcode) + b',"properties":' + _json_bytes(properties)
+                + b',"geometry":' + shapely.to_geojson(geometry).encode("utf-8") + b'}')
+
+
+def load_region_api() -> Optional[RegionApi]:
+    """加载数据、地名索引、全文索引和几何金字塔"""
+    start = time.perf_counter()
+    data = main_data_processing()
+    if not data:
+        return None
+    pyramid = get_geometry_pyramid()
+    for layer in SHAPEFILE_PATHS:
+        # 等待简化几何就绪，避免同一 URL 先后返回不同级别的几何
+        if not pyramid.wait_ready(layer):
+            print(f"Geometry pyramid for '{layer}' is unavailable; ?detail will return original geometry")
+    api = RegionApi(data, NameSearchIndex(data), FullTextIndex.load_or_build(FULLTEXT_INDEX_PATH, data), pyramid)
+    print(f"Loaded {len(api.name_index.regions)} regions in {time.perf_counter() - start:.1f}s")
+    return api
+
+
+class ApiServer:
+    """HTTP/1.1 协议处理：解析请求、缓存响应、处理条件请求和 gzip"""
+    def __init__(self, api: RegionApi):
+        self.api = api
+        self._cache: OrderedDict = OrderedDict()  # URL -> ApiResponse，最近使用的放在末尾
+        # 查询在单独线程中执行，较慢的全文检索不会阻塞其他连接的事件处理
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-query")
+
+    async def response_for(self, target: str) -> ApiResponse:
+        response = self._cache.get(target)
+        if response is not None:
+            self._cache.move_to_end(target)
+            return response
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        response = await asyncio.get_running_loop().run_in_executor(self._executor, self.api.respond, url.path, query)
+        if response.status == 200:
+            self._cache[target] = response
+            if len(self._cache) > API_RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return response
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), API_KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._error_bytes(431, "request headers too large"))
+                    break
+                keep_alive = await self._handle_request(head, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        """处理一个请求并写出响应，返回连接是否保持"""
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            writer.write(self._error_bytes(400, "malformed request line"))
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            writer.write(self._error_bytes(400, "invalid Content-Length"))
+            return False
+        if length:
+            # 接口不接受请求体，读掉以便继续处理同一连接上的下一个请求
+            await reader.readexactly(length)
+        if method not in ("GET", "HEAD"):
+            writer.write(self._error_bytes(405, "only GET and HEAD are supported", keep_alive, "Allow: GET, HEAD\r\n"))
+            return keep_alive
+
+        response = await self.response_for(target)
+        use_gzip = len(response.body) >= API_GZIP_MIN_BYTES and _accepts_gzip(headers.get("accept-encoding", ""))
+        etag = response.gzip_etag if use_gzip else response.etag
+        if response.status == 200 and _etag_matches(headers.get("if-none-match"), (response.etag, response.gzip_etag)):
+            writer.write(self._head_bytes(304, keep_alive, f"ETag: {etag}\r\nVary: Accept-Encoding\r\n"))
+            return keep_alive
+        body = response.gzip_body() if use_gzip else response.body
+        extra = f"Content-Type: {response.content_type}\r\nContent-Length: {len(body)}\r\nVary: Accept-Encoding\r\n"
+        if response.status == 200:
+            extra += f"ETag: {etag}\r\nCache-Control: no-cache\r\n"
+        if use_gzip:
+            extra += "Content-Encoding: gzip\r\n"
+        writer.write(self._head_bytes(response.status, keep_alive, extra))
+        if method == "GET":
+            writer.write(body)
+        return keep_alive
+
+    def _head_bytes(self, status: int, keep_alive: bool, extra: str = "") -> bytes:
+        return (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n{extra}"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1")
+
+    def _error_bytes(self, status: int, message: str, keep_alive: bool = False, extra: str = "") -> bytes:
+        body = _json_bytes({"error": message})
+        extra += f"Content-Type: {JSON_CONTENT_TYPE}\r\nContent-Length: {len(body)}\r\n"
+        return self._head_bytes(status, keep_alive, extra) + body
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Accept-Encoding 中列出 gzip（或 *）且 q 不为 0"""
+    for item in accept_encoding.lower().split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if coding not in ("gzip", "*"):
+            continue
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    return float(param[2:]) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def _etag_matches(if_none_match: Optional[str], etags: Tuple[str, ...]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # 比较时忽略弱校验前缀 W/
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+async def serve(api: RegionApi, host: str = API_HOST, port: int = API_PORT):
+    server = ApiServer(api)
+    async with await asyncio.start_server(server.handle_connection, host, port, limit=API_MAX_HEADER_BYTES) as listener:
+        addresses = ", ".join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in listener.sockets)
+        print(f"Serving region API on {addresses} (Ctrl+C to stop)")
+        await listener.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="serve", description="Serve region lookup, search and geometry over local HTTP.")
+    parser.add_argument("--host", default=API_HOST, help=f"loopback address to listen on (default: {API_HOST})")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"port to listen on (default: {API_PORT})")
+    args = parser.parse_args(argv)
+    try:
+        local = args.host == "localhost" or ipaddress.ip_address(args.host).is_loopback
+    except ValueError:
+        local = False
+    if not local:
+        parser.error("the API is local only; --host must be a loopback address")
+    api = load_region_api()
+    if api is None:
+        print("No data to serve.")
+        return 1
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+"""
+link_data 基准测试：对比旧的逐行布尔筛选实现与哈希索引实现。
+
+用法: python bench_link_data.py [--repeat N]
+"""
+import argparse
+import time
+
+from core import (
+    MD_FILE_PATH, ProcessedData, AdministrativeRegion, ShapefileData,
+    parse_markdown, get_geo_data_store, normalize_name, link_data, iter_regions,
+)
+
+
+def link_data_masked(md_data: ProcessedData, shp_data: ShapefileData) -> ProcessedData:
+    """旧实现：每个省/市/区县都对整列做一次布尔筛选，仅作为基准参照"""
+    gdf_provinces = shp_data["province"]
+    gdf_cities = shp_data["city"]
+    gdf_districts = shp_data["district"]
+
+    gdf_provinces['pr_name_normalized'] = gdf_provinces['pr_name'].astype(str).apply(normalize_name)
+    gdf_cities['ct_name_normalized'] = gdf_cities['ct_name'].astype(str).apply(normalize_name)
+    gdf_districts['dt_name_normalized'] = gdf_districts['dt_name'].astype(str).apply(normalize_name)
+
+    for province_md in md_data:
+        matched_prov_shp = gdf_provinces[gdf_provinces['pr_name_normalized'] == province_md["name"].strip()]
+        if not matched_prov_shp.empty:
+            province_shp_row = matched_prov_shp.iloc[0]
+            province_md["adcode"] = province_shp_row["pr_adcode"]
+            province_md["geometry"] = province_shp_row.geometry
+
+        for city_md in province_md.get("children", []):
+            parent_province_adcode = province_md.get("adcode")
+            if parent_province_adcode is None:
+                continue
+            potential_cities_shp = gdf_cities[gdf_cities['pr_adcode'] == parent_province_adcode]
+            matched_city_shp = potential_cities_shp[potential_cities_shp['ct_name_normalized'] == city_md["name"].strip()]
+            if not matched_city_shp.empty:
+                city_shp_row = matched_city_shp.iloc[0]
+                city_md["adcode"] = city_shp_row["ct_adcode"]
+                city_md["geometry"] = city_shp_row.geometry
+
+            for district_md in city_md.get("children", []):
+                parent_city_adcode = city_md.get("adcode")
+                if parent_city_adcode is None:
+                    continue
+                potential_districts_shp = gdf_districts[gdf_districts['ct_adcode'] == parent_city_adcode]
+                matched_district_shp = potential_districts_shp[potential_districts_shp['dt_name_normalized'] == district_md["name"].strip()]
+                if not matched_district_shp.empty:
+                    district_shp_row = matched_district_shp.iloc[0]
+                    district_md["adcode"] = district_shp_row["dt_adcode"]
+                    district_md["geometry"] = district_shp_row.geometry
+
+    # parent_adcode 由 Region 根据上级链接结果给出，原先的第二遍填充已不需要
+    return md_data
+
+
+def _same_link(a: AdministrativeRegion, b: AdministrativeRegion) -> bool:
+    if a.get("adcode") != b.get("adcode") or a.get("parent_adcode") != b.get("parent_adcode"):
+        return False
+    geom_a, geom_b = a.get("geometry"), b.get("geometry")
+    if geom_a is None or geom_b is None:
+        return geom_a is geom_b
+    return geom_a is geom_b or geom_a.equals_exact(geom_b, 0)
+
+
+def _time_linker(linker, shp_data: ShapefileData, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        md_data = parse_markdown(MD_FILE_PATH)
+        start = time.perf_counter()
+        result = linker(md_data, shp_data)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark link_data against the boolean-mask implementation.")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per implementation (best time is reported)")
+    args = parser.parse_args()
+
+    store = get_geo_data_store()
+    store.load_all()
+    print(store.format_load_timings())
+    if not all(layer in store for layer in ("province", "city", "district")):
+        print("Province/city/district shapefiles are required for this benchmark.")
+        return
+
+    masked_time, masked_data = _time_linker(link_data_masked, store, args.repeat)
+    indexed_time, indexed_data = _time_linker(link_data, store, args.repeat)
+
+    regions_masked = list(iter_regions(masked_data))
+    regions_indexed = list(iter_regions(indexed_data))
+    mismatches = sum(1 for a, b in zip(regions_masked, regions_indexed) if not _same_link(a, b))
+    mismatches += abs(len(regions_masked) - len(regions_indexed))
+    linked = sum(1 for region in regions_indexed if region.get("adcode") is not None)
+
+    print(f"Regions: {len(regions_indexed)} ({linked} linked)")
+    print(f"boolean-mask link_data: {masked_time * 1000:.1f} ms")
+    print(f"hash-indexed link_data: {indexed_time * 1000:.1f} ms")
+    if indexed_time > 0:
+        print(f"speedup: {masked_time / indexed_time:.1f}x")
+    print("assignments identical" if mismatches == 0 else f"MISMATCHED assignments: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+矢量瓦片生成：把已链接的省/市/区县几何切分为 Mapbox Vector Tiles（缩放级别 0~12），写入 MBTiles (SQLite) 文件。
+
+每个缩放级别按该级别一个瓦片像素的大小简化几何，要素带 adcode / name / level / parent_adcode 属性。
+在进程池中切片；MBTiles 中记录每个要素的指纹和范围，再次运行时只重新生成 adcode 有变化的要素所覆盖的瓦片。
+需要可选依赖 mapbox-vector-tile（pip install mapbox-vector-tile）。
+
+用法: python main.py build-tiles OUTPUT.mbtiles [--min-zoom 0] [--max-zoom 12] [--workers N] [--force]
+      python build_tiles.py OUTPUT.mbtiles [...]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+try:
+    import mapbox_vector_tile
+    from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+except ImportError:
+    mapbox_vector_tile = None
+
+from core import (
+    LEVEL_LAYERS, get_geo_data_store, get_geometry_pyramid, get_region_index, iter_regions, main_data_processing,
+)
+
+TILE_MIN_ZOOM = 0
+TILE_MAX_ZOOM = 12
+TILE_EXTENT = 4096               # 瓦片内坐标范围
+TILE_BUFFER = 64                 # 瓦片四周多切出的范围（瓦片坐标单位），避免相邻瓦片接缝处描边断开
+TILE_SIMPLIFY_UNITS = 1.0        # 简化容差，以该级别的瓦片坐标单位计
+TILE_SPLIT_ZOOM = 6              # 该级别及以上，每个任务负责一个该级别瓦片及其全部下级瓦片
+TILE_LAYER_MIN_ZOOMS = {"province": 0, "city": 4, "district": 6}  # 各图层从哪一级开始出现在瓦片中
+TILE_FORMAT_VERSION = 1          # 切片方式变化时递增，使已有的 MBTiles 全部重新生成
+TILE_COMMIT_INTERVAL = 2000      # 每写入多少个瓦片提交一次
+WEB_MERCATOR_ORIGIN = 20037508.342789244
+WEB_MERCATOR_CRS = "EPSG:3857"
+
+TileKey = Tuple[int, int, int]   # (z, x, y)，y 自上而下（XYZ 方案）
+
+
+class TileFeatures:
+    """一个图层中参与切片的要素：Web 墨卡托几何、属性、adcode、指纹，以及在图层中的行号（供取简化几何）"""
+    def __init__(self, layer: str, geometries: np.ndarray, properties: List[Dict], keys: List[str],
+                 fingerprints: List[str], rows: List[Optional[int]], crs):
+        self.layer = layer
+        self.geometries = geometries
+        self.properties = properties
+        self.keys = keys
+        self.fingerprints = fingerprints
+        self.rows = rows
+        self.crs = crs
+        self.bounds = shapely.bounds(geometries)
+        self._tree: Optional[shapely.STRtree] = None
+
+    @property
+    def tree(self) -> shapely.STRtree:
+        if self._tree is None:
+            self._tree = shapely.STRtree(self.geometries)
+        return self._tree
+
+
+def load_tile_features() -> Dict[str, TileFeatures]:
+    """读取已链接区域，按图层投影到 Web 墨卡托；同级同 adcode 的区域只取第一个。主进程和子进程结果相同"""
+    data = main_data_processing()
+    if not data:
+        return {}
+    crs = get_geo_data_store()["province"].crs
+    region_index = get_region_index()
+    rows: Dict[str, List] = {layer: [] for layer in TILE_LAYER_MIN_ZOOMS}
+    seen = set()
+    for region in iter_regions(data):
+        layer = LEVEL_LAYERS.get(region.level)
+        if layer not in rows or region.adcode is None or region.geometry is None or region.geometry.is_empty:
+            continue
+        key = str(region.adcode)
+        if (layer, key) in seen:
+            continue
+        seen.add((layer, key))
+        properties = {"adcode": _property_value(region.adcode), "name": region.name, "level": region.level}
+        if region.parent_adcode is not None:
+            properties["parent_adcode"] = _property_value(region.parent_adcode)
+        rows[layer].append((region.geometry, properties, key, region_index.row(layer, region.adcode)))
+
+    features = {}
+    for layer, layer_rows in rows.items():
+        if not layer_rows:
+            continue
+        geometries = np.array([row[0] for row in layer_rows], dtype=object)
+        fingerprints = [hashlib.sha1(wkb + json.dumps(row[1], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+                        for wkb, row in zip(shapely.to_wkb(geometries), layer_rows)]
+        projected = gpd.GeoSeries(geometries, crs=crs).to_crs(WEB_MERCATOR_CRS).to_numpy()
+        features[layer] = TileFeatures(layer, projected, [row[1] for row in layer_rows], [row[2] for row in layer_rows],
+                                       fingerprints, [row[3] for row in layer_rows], crs)
+    return features
+
+
+def _property_value(value):
+    """MVT 属性只能是字符串或数值"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return str(value)
+
+
+def tile_size(zoom: int) -> float:
+    return 2 * WEB_MERCATOR_ORIGIN / (1 << zoom)
+
+
+def tile_bounds(zoom: int, x: int, y: int, buffer: float = 0.0) -> Tuple[float, float, float, float]:
+    """瓦片的 Web 墨卡托范围；buffer 以瓦片坐标单位计"""
+    size = tile_size(zoom)
+    pad = size * buffer / TILE_EXTENT
+    minx = -WEB_MERCATOR_ORIGIN + x * size
+    maxy = WEB_MERCATOR_ORIGIN - y * size
+    return (minx - pad, maxy - size - pad, minx + size + pad, maxy + pad)
+
+
+def tiles_covering(bounds, zoom: int) -> Iterator[TileKey]:
+    """与范围 (minx, miny, maxx, maxy) 相交的全部瓦片（含缓冲区）"""
+    size = tile_size(zoom)
+    pad = size * TILE_BUFFER / TILE_EXTENT
+    last = (1 << zoom) - 1
+    minx, miny, maxx, maxy = bounds
+    x0 = max(0, int(math.floor((minx - pad + WEB_MERCATOR_ORIGIN) / size)))
+    x1 = min(last, int(math.floor((maxx + pad + WEB_MERCATOR_ORIGIN) / size)))
+    y0 = max(0, int(math.floor((WEB_MERCATOR_ORIGIN - maxy - pad) / size)))
+    y1 = min(last, int(math.floor((WEB_MERCATOR_ORIGIN - miny + pad) / size)))
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield (zoom, x, y)
+
+
+def visible_layers(zoom: int) -> List[str]:
+    return [layer for layer, min_zoom in TILE_LAYER_MIN_ZOOMS.items() if zoom >= min_zoom]
+
+
+def ancestor(tile: TileKey, zoom: int) -> TileKey:
+    z, x, y = tile
+    shift = z - zoom
+    return (zoom, x >> shift, y >> shift)
+
+
+def plan_jobs(tiles: Set[TileKey], max_zoom: int, full: bool) -> List[Tuple[TileKey, Optional[frozenset]]]:
+    """把要生成的瓦片分成任务：(根瓦片, 需要的瓦片集合)；整体生成时集合为 None，表示根瓦片下的全部瓦片"""
+    split_zoom = min(TILE_SPLIT_ZOOM, max_zoom)
+    jobs: List[Tuple[TileKey, Optional[frozenset]]] = []
+    grouped: Dict[TileKey, Set[TileKey]] = {}
+    for tile in tiles:
+        if tile[0] < split_zoom:
+            jobs.append((tile, frozenset([tile])))
+        else:
+            grouped.setdefault(ancestor(tile, split_zoom), set()).add(tile)
+    for root, wanted in grouped.items():
+        jobs.append((root, None if full else frozenset(wanted)))
+    return jobs
+
+
+def wait_for_pyramid(layers: Iterable[str]):
+    """等待各图层的简化几何生成并写入缓存；主进程先调用，子进程随后直接读取缓存"""
+    pyramid = get_geometry_pyramid()
+    for layer in layers:
+        if not pyramid.wait_ready(layer):
+            print(f"Geometry pyramid for '{layer}' is unavailable; simplifying original geometry")
+
+
+# --- 子进程 ---
+_worker_features: Dict[str, TileFeatures] = {}
+_worker_sources: Dict[Tuple[str, int], np.ndarray] = {}
+_worker_simplified: Dict[Tuple[str, int], Dict[int, object]] = {}
+_worker_min_zoom = TILE_MIN_ZOOM
+_worker_max_zoom = TILE_MAX_ZOOM
+
+
+def _init_worker(min_zoom: int, max_zoom: int):
+    global _worker_features, _worker_min_zoom, _worker_max_zoom
+    _worker_features = load_tile_features()
+    _worker_min_zoom = min_zoom
+    _worker_max_zoom = max_zoom
+    wait_for_pyramid(_worker_features)
+
+
+def _source_geometries(layer: str, level: int) -> np.ndarray:
+    """要素在几何金字塔某一级的 Web 墨卡托几何；没有对应行的要素使用原始几何"""
+    key = (layer, level)
+    if key not in _worker_sources:
+        features = _worker_features[layer]
+        series = get_geometry_pyramid().layer(layer, level) if level > 0 else None
+        if series is None:
+            _worker_sources[key] = features.geometries
+        else:
+            level_geometries = series.to_numpy()
+            geometries = [level_geometries[row] if row is not None else None for row in features.rows]
+            projected = gpd.GeoSeries(geometries, crs=features.crs).to_crs(WEB_MERCATOR_CRS).to_numpy()
+            _worker_sources[key] = np.where(shapely.is_missing(projected), features.geometries, projected)
+    return _worker_sources[key]
+
+
+def _simplified(layer: str, zoom: int, positions: np.ndarray) -> np.ndarray:
+    """要素在该级别下的简化几何：从误差不超过一个瓦片单位的最粗金字塔级别开始简化，
+    只处理本任务用到的要素，结果在子进程中缓存"""
+    cache = _worker_simplified.setdefault((layer, zoom), {})
+    missing = [position for position in positions.tolist() if position not in cache]
+    if missing:
+        level = get_geometry_pyramid().select_level(360.0 / (1 << zoom) / TILE_EXTENT)
+        tolerance = tile_size(zoom) / TILE_EXTENT * TILE_SIMPLIFY_UNITS
+        simplified = shapely.simplify(_source_geometries(layer, level)[missing], tolerance, preserve_topology=True)
+        cache.update(zip(missing, simplified))
+    result = np.empty(len(positions), dtype=object)
+    result[:] = [cache[position] for position in positions.tolist()]
+    return result
+
+
+def _clip(geometries: np.ndarray, properties: List[Dict], bounds) -> Optional[Tuple[np.ndarray, List[Dict]]]:
+    """把几何裁剪到范围内，只保留非空的面"""
+    if len(geometries) == 0:
+        return None
+    clipped = shapely.clip_by_rect(geometries, *bounds)
+    keep = np.isin(shapely.get_type_id(clipped), (3, 6)) & ~shapely.is_empty(clipped)
+    if not keep.any():
+        return None
+    return clipped[keep], [properties[i] for i in np.flatnonzero(keep)]
+
+
+def _to_tile_coordinates(tile: TileKey, geometries: np.ndarray) -> np.ndarray:
+    """换算为瓦片内的整数坐标（y 向下）并对齐到整数网格，外环按 MVT 规范定向；
+    用 shapely 批量完成，编码时不再逐点量化和检查环的方向"""
+    minx, _, maxx, maxy = tile_bounds(*tile)
+    scale = TILE_EXTENT / (maxx - minx)
+    transformed = shapely.transform(geometries, lambda coords: (coords - (minx, maxy)) * (scale, -scale))
+    return shapely.orient_polygons(shapely.set_precision(transformed, 1.0), exterior_cw=False)
+
+
+def _encode(tile: TileKey, layers: Dict[str, Tuple[np.ndarray, List[Dict]]]) -> Optional[bytes]:
+    tile_layers = []
+    for layer, (geometries, properties) in layers.items():
+        tile_geometries = _to_tile_coordinates(tile, geometries)
+        features = [{"geometry": geometry, "properties": props}
+                    for geometry, props in zip(tile_geometries, properties)
+                    if geometry is not None and not geometry.is_empty]
+        if features:
+            tile_layers.append({"name": layer, "features": features})
+    if not tile_layers:
+        return None
+    data = mapbox_vector_tile.encode(tile_layers, default_options={
+        "extents": TILE_EXTENT, "y_coord_down": True, "check_winding_order": False,
+        "on_invalid_geometry": on_invalid_geometry_make_valid})
+    return gzip.compress(data)
+
+
+def _descend(tile: TileKey, target_zoom: int, layers: Dict, wanted: Optional[frozenset],
+             ancestors: Optional[Set[TileKey]], results: List):
+    """逐级四分裁剪到目标级别：每次只裁剪上一级已裁剪过的几何"""
+    if ancestors is not None and tile not in ancestors:
+        return
+    z, x, y = tile
+    if z == target_zoom:
+        if wanted is None or tile in wanted:
+            results.append((tile, _encode(tile, layers)))
+        return
+    for child in ((z + 1, 2 * x, 2 * y), (z + 1, 2 * x + 1, 2 * y),
+                  (z + 1, 2 * x, 2 * y + 1), (z + 1, 2 * x + 1, 2 * y + 1)):
+        bounds = tile_bounds(*child, buffer=TILE_BUFFER)
+        child_layers = {}
+        for layer, (geometries, properties) in layers.items():
+            clipped = _clip(geometries, properties, bounds)
+            if clipped is not None:
+                child_layers[layer] = clipped
+        # 增量生成时空瓦片也要返回，以便删除旧瓦片
+        if child_layers or wanted is not None:
+            _descend(child, target_zoom, child_layers, wanted, ancestors, results)
+
+
+def _render_job(root: TileKey, wanted: Optional[frozenset]) -> List[Tuple[TileKey, Optional[bytes]]]:
+    """生成根瓦片下需要的瓦片，返回 (瓦片, gzip 压缩的 MVT 数据或 None 表示空瓦片)"""
+    if wanted is None:
+        ancestors = None
+        first_zoom, last_zoom = max(root[0], _worker_min_zoom), _worker_max_zoom
+    else:
+        ancestors = {ancestor(tile, zoom) for tile in wanted for zoom in range(root[0], tile[0] + 1)}
+        first_zoom, last_zoom = min(tile[0] for tile in wanted), max(tile[0] for tile in wanted)
+    results: List[Tuple[TileKey, Optional[bytes]]] = []
+    root_bounds = tile_bounds(*root, buffer=TILE_BUFFER)
+    query_box = shapely.box(*root_bounds)
+    for zoom in range(first_zoom, last_zoom + 1):
+        layers = {}
+        for layer in visible_layers(zoom):
+            if layer not in _worker_features:
+                continue
+            features = _worker_features[layer]
+            candidates = np.sort(features.tree.query(query_box))
+            clipped = _clip(_simplified(layer, zoom, candidates), [features.properties[i] for i in candidates],
+                            root_bounds)
+            if clipped is not None:
+                layers[layer] = clipped
+        if layers or wanted is not None:
+            _descend(root, zoom, layers, wanted, ancestors, results)
+    return results
+
+
+# --- MBTiles ---
+def open_mbtiles(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row);
+        CREATE TABLE IF NOT EXISTS tile_features (layer TEXT, adcode TEXT, fingerprint TEXT,
+            minx REAL, miny REAL, maxx REAL, maxy REAL, PRIMARY KEY (layer, adcode));
+    """)
+    return conn
+
+
+def _tms_row(tile: TileKey) -> int:
+    """MBTiles 使用 TMS 行号（自下而上）"""
+    z, _, y = tile
+    return (1 << z) - 1 - y
+
+
+def _write_tiles(conn: sqlite3.Connection, results: List[Tuple[TileKey, Optional[bytes]]]):
+    for tile, data in results:
+        z, x, _ = tile
+        if data is None:
+            conn.execute("DELETE FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?", (z, x, _tms_row(tile)))
+        else:
+            conn.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, _tms_row(tile), data))
+
+
+def _write_metadata(conn: sqlite3.Connection, features: Dict[str, TileFeatures], min_zoom: int, max_zoom: int,
+                    options_key: str):
+    all_bounds = np.vstack([layer_features.bounds for layer_features in features.values()])
+    merc = gpd.GeoSeries([shapely.box(*all_bounds[:, :2].min(axis=0), *all_bounds[:, 2:].max(axis=0))],
+                         crs=WEB_MERCATOR_CRS).to_crs("EPSG:4326")
+    west, south, east, north = merc.total_bounds
+    vector_layers = [{"id": layer, "minzoom": max(min_zoom, TILE_LAYER_MIN_ZOOMS[layer]), "maxzoom": max_zoom,
+                      "fields": {"adcode": "Number", "name": "String", "level": "Number", "parent_adcode": "Number"}}
+                     for layer in features]
+    metadata = {
+        "name": "九域真形图 行政区划",
+        "format": "pbf",
+        "type": "overlay",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}",
+        "center": f"{(west + east) / 2:.6f},{(south + north) / 2:.6f},{min(max_zoom, max(min_zoom, 4))}",
+        "json": json.dumps({"vector_layers": vector_layers}, ensure_ascii=False),
+        "tile_options": options_key,
+    }
+    conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", metadata.items())
+
+
+def build_tiles(mbtiles_path: str, min_zoom: int = TILE_MIN_ZOOM, max_zoom: int = TILE_MAX_ZOOM,
+                workers: Optional[int] = None, force: bool = False) -> bool:
+    """生成（或增量更新）MBTiles；返回是否成功"""
+    if mapbox_vector_tile is None:
+        print("mapbox-vector-tile is not installed; run 'pip install mapbox-vector-tile' to build vector tiles.")
+        return False
+    start = time.perf_counter()
+    features = load_tile_features()
+    if not features:
+        print("No linked regions to tile.")
+        return False
+    wait_for_pyramid(features)
+
+    options_key = json.dumps({"version": TILE_FORMAT_VERSION, "min_zoom": min_zoom, "max_zoom": max_zoom,
+                              "extent": TILE_EXTENT, "buffer": TILE_BUFFER, "simplify": TILE_SIMPLIFY_UNITS,
+                              "layers": TILE_LAYER_MIN_ZOOMS}, sort_keys=True)
+    conn = open_mbtiles(mbtiles_path)
+    stored = conn.execute("SELECT value FROM metadata WHERE name='tile_options'").fetchone()
+    full = force or stored is None or stored[0] != options_key
+
+    current = {(layer, key): (fingerprint, tuple(bounds))
+               for layer, layer_features in features.items()
+               for key, fingerprint, bounds in zip(layer_features.keys, layer_features.fingerprints,
+                                                   layer_features.bounds.tolist())}
+    tiles: Set[TileKey] = set()
+    if full:
+        conn.execute("DELETE FROM tiles")
+        changed = list(current)
+        # 分组级别以下逐个瓦片生成，分组级别的瓦片作为根，由子进程生成其下 min_zoom~max_zoom 的全部瓦片
+        split_zoom = min(TILE_SPLIT_ZOOM, max_zoom)
+        for (layer, _), (_, bounds) in current.items():
+            first_zoom = max(min(min_zoom, split_zoom), min(TILE_LAYER_MIN_ZOOMS[layer], split_zoom))
+            for zoom in range(first_zoom, split_zoom + 1):
+                tiles.update(tiles_covering(bounds, zoom))
+    else:
+        previous = {(layer, adcode): (fingerprint, (minx, miny, maxx, maxy))
+                    for layer, adcode, fingerprint, minx, miny, maxx, maxy
+                    in conn.execute("SELECT * FROM tile_features")}
+        changed = [key for key in current.keys() | previous.keys()
+                   if current.get(key, (None,))[0] != previous.get(key, (None,))[0]]
+        # 新旧两个范围覆盖的瓦片都要重新生成
+        for key in changed:
+            for _, bounds in filter(None, (current.get(key), previous.get(key))):
+                for zoom in range(max(min_zoom, TILE_LAYER_MIN_ZOOMS[key[0]]), max_zoom + 1):
+                    tiles.update(tiles_covering(bounds, zoom))
+    print(f"Prepared tiling in {time.perf_counter() - start:.1f}s: "
+          f"{'full build' if full else f'{len(changed)} changed adcodes'}")
+
+    jobs = plan_jobs(tiles, max_zoom, full)
+    workers = workers or os.cpu_count() or 1
+    written = empty = failed = 0
+    render_start = time.perf_counter()
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(min_zoom, max_zoom)) as executor:
+            futures = [executor.submit(_render_job, root, wanted) for root, wanted in jobs]
+            pending_commit = 0
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"Error building tiles: {e}")
+                    continue
+                _write_tiles(conn, results)
+                written += sum(1 for _, data in results if data is not None)
+                empty += sum(1 for _, data in results if data is None)
+                pending_commit += len(results)
+                if pending_commit >= TILE_COMMIT_INTERVAL:
+                    conn.commit()
+                    pending_commit = 0
+                if done % 20 == 0 or done == len(futures):
+                    print(f"Finished {done}/{len(futures)} jobs, {written} tiles")
+
+    if failed == 0:
+        # 全部瓦片写完后才更新要素指纹和设置，中断时下次运行会重新生成
+        conn.execute("DELETE FROM tile_features")
+        conn.executemany("INSERT INTO tile_features VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(layer, key, fingerprint, *bounds)
+                          for (layer, key), (fingerprint, bounds) in current.items()])
+        _write_metadata(conn, features, min_zoom, max_zoom, options_key)
+    conn.commit()
+    conn.close()
+
+    elapsed = time.perf_counter() - render_start
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(f"Wrote {written} tiles ({empty} emptied) in {elapsed:.1f}s ({rate:.0f} tiles/s, {workers} workers), "
+          f"{failed} failed jobs -> {mbtiles_path}")
+    return failed == 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="build-tiles", description="Cut linked regions into MVT tiles in an MBTiles file.")
+    parser.add_argument("output", help="MBTiles file to create or update")
+    parser.add_argument("--min-zoom", type=int, default=TILE_MIN_ZOOM, help=f"lowest zoom level (default: {TILE_MIN_ZOOM})")
+    parser.add_argument("--max-zoom", type=int, default=TILE_MAX_ZOOM, help=f"highest zoom level (default: {TILE_MAX_ZOOM})")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild every tile instead of only changed adcodes")
+    args = parser.parse_args(argv)
+    if not 0 <= args.min_zoom <= args.max_zoom:
+        parser.error("zoom levels must satisfy 0 <= --min-zoom <= --max-zoom")
+    return 0 if build_tiles(args.output, args.min_zoom, args.max_zoom, args.workers, args.force) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
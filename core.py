@@ -0,0 +1,1982 @@
+"""
+九域真形图的数据与绘图核心：沿革数据解析、地图读取与缓存、区域索引、全文检索、几何金字塔和 MapRenderer。
+
+本模块不导入 Qt，桌面程序（main.py）和命令行工具（export_maps.py、build_tiles.py、api_server.py）都从这里导入。
+"""
+import re
+import os
+import sys
+import math
+import time
+import mmap
+import pickle
+import struct
+import hashlib
+import importlib.util
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import shutil
+import tempfile
+from typing import List, Dict, Any, Optional, Mapping, Iterable, Iterator, Tuple, Callable
+
+try:
+    import py7zr  # 可选：直接读取随仓库发布的 .7z 地图压缩包
+except ImportError:
+    py7zr = None
+
+# Matplotlib imports (no GUI backend)
+from matplotlib.figure import Figure
+from matplotlib.path import Path
+from matplotlib.collections import PathCollection
+
+# --- Configuration ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MD_FILE_PATH = os.path.join(SCRIPT_DIR, "output.md")
+MAPS_BASE_DIR = os.path.join(SCRIPT_DIR, "maps")
+
+COUNTRY_SHP_PATH = os.path.join(MAPS_BASE_DIR, "1.Country", "country.shp")
+PROVINCE_SHP_PATH = os.path.join(MAPS_BASE_DIR, "2.Province", "province.shp")
+CITY_SHP_PATH = os.path.join(MAPS_BASE_DIR, "3.City", "city.shp")
+DISTRICT_SHP_PATH = os.path.join(MAPS_BASE_DIR, "4.District", "district.shp")
+
+# 核心修改：在打包后使用 sys._MEIPASS 来定位资源文件
+if getattr(sys, 'frozen', False):
+    # 被 PyInstaller 打包时使用临时目录
+    SCRIPT_DIR = sys._MEIPASS
+else:
+    # 正常运行使用当前脚本目录
+    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MD_FILE_PATH = os.path.join(SCRIPT_DIR, "output.md")
+MAPS_BASE_DIR = os.path.join(SCRIPT_DIR, "maps")
+
+# 缓存目录：打包后 _MEIPASS 每次启动都会重建，因此缓存放在可执行文件旁边
+if getattr(sys, 'frozen', False):
+    CACHE_DIR = os.path.join(os.path.dirname(sys.executable), "cache")
+else:
+    CACHE_DIR = os.path.join(SCRIPT_DIR, "cache")
+
+DATASET_CACHE_PATH = os.path.join(CACHE_DIR, "dataset.bin")
+DATASET_CACHE_MAGIC = b"JYZXT-DATASET"
+DATASET_CACHE_VERSION = 4  # 缓存结构变化时递增，旧缓存自动失效
+
+FULLTEXT_INDEX_PATH = os.path.join(CACHE_DIR, "fulltext.idx")
+FULLTEXT_INDEX_MAGIC = b"JYZXT-FULLTEXT"
+FULLTEXT_INDEX_VERSION = 1
+
+# 转换后的图层（FlatGeobuf，带打包的空间索引），读取比 shapefile 快，并支持按范围/列读取
+CONVERTED_LAYER_DIR = os.path.join(CACHE_DIR, "layers")
+CONVERTED_LAYER_MAGIC = b"JYZXT-LAYER"
+CONVERTED_LAYER_VERSION = 2
+SOURCE_ROW_COLUMN = "src_row"  # 原 shapefile 中的行号，FlatGeobuf 按空间索引重排要素后据此恢复顺序
+
+# 市、区县图层只以 .7z 发布；未手动解压时自动解压到缓存目录，并按压缩包哈希校验
+SHAPEFILE_ARCHIVES = {
+    "city": os.path.join(MAPS_BASE_DIR, "3.City.7z"),
+    "district": os.path.join(MAPS_BASE_DIR, "4.District.7z"),
+}
+EXTRACTED_MAPS_DIR = os.path.join(CACHE_DIR, "maps")
+EXTRACTED_MAPS_MAGIC = b"JYZXT-MAPS"
+EXTRACTED_MAPS_VERSION = 1
+
+# --- Regex ---
+H1_MD_PATTERN = re.compile(r"^#\s+第[0-9]+章\s*(.+)$")
+H2_SPECIAL_ZERO_PATTERN = re.compile(r"^##\s+零、上位类说明$")
+H2_MD_PATTERN = re.compile(r"^##\s+(?:一|二|三|四|五|六|七|八|九|十|十一|十二|十三|十四|十五|十六|十七|十八|十九|二十|二十一|二十二|二十三|二十四|二十五|二十六|二十七|二十八|二十九|三十|三十一|三十二|三十三|三十四|三十五|三十六|三十七| ৩৮)、\s*(.+)$")
+H3_SPECIAL_ZERO_PATTERN = re.compile(r"^###\s+0\.上位类说明$")
+H3_MD_PATTERN = re.compile(r"^###\s*([1-9]|1[0-9]|2[0-5])\.\s*(.+)$")
+
+# 文本位置：若干文本块，每块是 (偏移, 长度, 偏移, 长度, ...) 的字节区间序列
+TextSpans = Tuple[Tuple[int, ...], ...]
+
+class MarkdownTextSource:
+    """通过 mmap 按字节区间读取 output.md 中的沿革文本"""
+    def __init__(self, md_filepath: str):
+        self.md_filepath = md_filepath
+        self._mmap: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def buffer(self):
+        """返回文件内容的只读映射（空文件返回 b""）"""
+        with self._lock:
+            if self._mmap is None:
+                with open(self.md_filepath, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        return b""
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def read(self, spans: TextSpans) -> str:
+        """按 parse_markdown 原有规则还原文本：去掉空行，块内按行拼接后 strip，块之间换行连接"""
+        try:
+            data = self.buffer()
+        except OSError as e:
+            print(f"Error reading region text from '{self.md_filepath}': {e}")
+            return ""
+        blocks = []
+        for block in spans:
+            lines = []
+            for i in range(0, len(block), 2):
+                offset, length = block[i], block[i + 1]
+                chunk = data[offset:offset + length].decode('utf-8', errors='replace')
+                lines.extend(line for line in chunk.replace('\r\n', '\n').split('\n') if line.strip())
+            text = "\n".join(lines).strip()
+            if text:
+                blocks.append(text)
+        return "\n".join(blocks)
+
+_markdown_text_sources: Dict[str, MarkdownTextSource] = {}
+
+def get_markdown_text_source(md_filepath: str) -> MarkdownTextSource:
+    """同一个 Markdown 文件在进程内共用一个文本源"""
+    path = os.path.abspath(md_filepath)
+    if path not in _markdown_text_sources:
+        _markdown_text_sources[path] = MarkdownTextSource(path)
+    return _markdown_text_sources[path]
+
+class Region:
+    """行政区域节点（省/市/区县）。
+
+    使用 __slots__ 紧凑存储；同时支持 region['name']、region.get('children', [])
+    等字典式访问，兼容按字典读取区域数据的代码。
+    """
+    __slots__ = ("name", "level", "adcode", "parent", "children",
+                 "general_spans", "detail_spans", "text_source", "geometry")
+
+    def __init__(self, name: str, level: int, parent: Optional["Region"] = None,
+                 text_source: Optional["MarkdownTextSource"] = None):
+        self.name = name
+        self.level = level
+        self.adcode = None  # adcode 在link_data中填充
+        self.parent = parent
+        self.children = [] if level < 3 else ()  # 区县没有下级，共用空元组
+        # 沿革文本只记录在 output.md 中的字节位置，显示时才读取
+        self.general_spans: TextSpans = ()
+        self.detail_spans: TextSpans = ()
+        self.text_source = text_source
+        self.geometry = None
+
+    @property
+    def text_general(self) -> str:
+        if not self.general_spans or self.text_source is None:
+            return ""
+        return self.text_source.read(self.general_spans)
+
+    @property
+    def text_detail(self) -> str:
+        if not self.detail_spans or self.text_source is None:
+            return ""
+        return self.text_source.read(self.detail_spans)
+
+    @property
+    def parent_name(self) -> Optional[str]:
+        return self.parent.name if self.parent is not None else None
+
+    @property
+    def parent_adcode(self):
+        """只有自身和上级都已链接时才有值，与原先link_data第二遍的填充规则一致"""
+        if self.parent is None or self.adcode is None:
+            return None
+        return self.parent.adcode
+
+    # --- 字典式访问 ---
+    def keys(self):
+        return _REGION_KEYS[self.level]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _REGION_KEYS[self.level]:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _REGION_KEYS[self.level]:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in _REGION_KEYS[self.level]
+
+    def __repr__(self) -> str:
+        return f"Region(name={self.name!r}, level={self.level}, adcode={self.adcode!r})"
+
+# 各级区域可通过字典方式访问的字段（与原先字典结构的键一致）
+_REGION_KEYS = {
+    1: ("name", "level", "adcode", "text_general", "text_detail", "geometry", "children"),
+    2: ("name", "level", "parent_name", "parent_adcode", "adcode",
+        "text_general", "text_detail", "geometry", "children"),
+    3: ("name", "level", "parent_name", "parent_adcode", "adcode",
+        "text_general", "text_detail", "geometry"),
+}
+
+AdministrativeRegion = Region
+ProcessedData = List[AdministrativeRegion]
+ShapefileData = Mapping[str, gpd.GeoDataFrame]  # GeoDataStore 或普通字典
+
+# --- 数据处理函数 ---
+MD_TEXT, MD_H1, MD_H2_ZERO, MD_H2, MD_H3_ZERO, MD_H3 = range(6)
+
+def iter_markdown_lines(data) -> Iterator[Tuple[int, Optional[str], int, int]]:
+    """扫描Markdown字节内容，产出 (行类型, 标题名称, 偏移, 长度)。
+
+    只定位并解码含 '#' 的行；两个标题之间的正文整段作为一个 MD_TEXT 区间产出，不做解码。
+    """
+    size = len(data)
+    position = 0
+    while position < size:
+        hash_index = data.find(b"#", position)
+        if hash_index < 0:
+            break
+        line_start = data.rfind(b"\n", position, hash_index) + 1 or position
+        line_end = data.find(b"\n", hash_index)
+        line_end = size if line_end < 0 else line_end + 1
+
+        if line_start > position and data[position:line_start].strip():
+            yield MD_TEXT, None, position, line_start - position
+        position = line_end
+
+        line = data[line_start:line_end].decode('utf-8').strip()
+        if line.startswith("#"):
+            match_h1 = H1_MD_PATTERN.match(line)
+            if match_h1:
+                yield MD_H1, match_h1.group(1).strip(), line_start, line_end - line_start
+                continue
+            if H2_SPECIAL_ZERO_PATTERN.match(line):
+                yield MD_H2_ZERO, None, line_start, line_end - line_start
+                continue
+            match_h2 = H2_MD_PATTERN.match(line)
+            if match_h2:
+                yield MD_H2, match_h2.group(1).strip(), line_start, line_end - line_start
+                continue
+            if H3_SPECIAL_ZERO_PATTERN.match(line):
+                yield MD_H3_ZERO, None, line_start, line_end - line_start
+                continue
+            match_h3 = H3_MD_PATTERN.match(line)
+            if match_h3:
+                yield MD_H3, match_h3.group(2).strip(), line_start, line_end - line_start
+                continue
+
+        yield MD_TEXT, None, line_start, line_end - line_start
+
+    if position < size and data[position:].strip():
+        yield MD_TEXT, None, position, size - position
+
+def iter_parse_markdown(md_filepath: str) -> Iterator[Region]:
+    """流式解析Markdown：每个省级区域（含下辖市、区县）解析完成后立即产出。
+
+    沿革文本不读入内存，只记录其在文件中的字节区间，由 MarkdownTextSource 按需读取。
+    """
+    text_source = get_markdown_text_source(md_filepath)
+    current_province: Optional[Region] = None
+    current_city: Optional[Region] = None
+
+    active_entity: Optional[Region] = None
+    active_field: str = "detail_spans"
+
+    # 待写入的正文区间；相邻正文区间合并，遇到标题行则断开
+    current_text_buffer: List[List[int]] = []
+    buffer_broken = True
+    # 当前省内各区域各字段的文本块，省份结束时一次性写入
+    text_blocks: Dict[Tuple[Region, str], List[Tuple[int, ...]]] = {}
+
+    def flush_buffer():
+        if active_entity is not None and current_text_buffer:
+            block = tuple(value for start, end in current_text_buffer for value in (start, end - start))
+            text_blocks.setdefault((active_entity, active_field), []).append(block)
+            current_text_buffer.clear()
+
+    def finish_province() -> Region:
+        for (region, field), blocks in text_blocks.items():
+            setattr(region, field, tuple(blocks))
+        text_blocks.clear()
+        return current_province
+
+    for kind, name, line_offset, line_length in iter_markdown_lines(text_source.buffer()):
+        if kind != MD_TEXT:
+            buffer_broken = True
+
+        if kind == MD_H1:
+            flush_buffer()
+            if current_province is not None:
+                yield finish_province()
+            current_province = Region(name, 1, text_source=text_source)
+            active_entity = current_province
+            active_field = "detail_spans"
+            current_city = None
+            continue
+
+        if kind == MD_H2_ZERO and current_province:
+            flush_buffer()
+            active_entity = current_province
+            active_field = "general_spans"
+            continue
+
+        if kind == MD_H2 and current_province:
+            flush_buffer()
+            current_city = Region(name, 2, current_province, text_source)
+            current_province.children.append(current_city)
+            active_entity = current_city
+            active_field = "detail_spans"
+            continue
+
+        if kind == MD_H3_ZERO and current_city:
+            flush_buffer()
+            active_entity = current_city
+            active_field = "general_spans"
+            continue
+
+        if kind == MD_H3 and current_city:
+            flush_buffer()
+            current_district = Region(name, 3, current_city, text_source)
+            current_city.children.append(current_district)
+            active_entity = current_district
+            active_field = "detail_spans"
+            continue
+
+        # 正文区间（包括上下文不满足的标题行）
+        if current_text_buffer and not buffer_broken:
+            current_text_buffer[-1][1] = line_offset + line_length
+        else:
+            current_text_buffer.append([line_offset, line_offset + line_length])
+        buffer_broken = False
+
+    flush_buffer()
+    if current_province is not None:
+        yield finish_province()
+
+def parse_markdown(md_filepath: str) -> ProcessedData:
+    try:
+        return list(iter_parse_markdown(md_filepath))
+    except FileNotFoundError:
+        print(f"Error: Markdown file '{md_filepath}' not found.")
+        return []
+    except Exception as e:
+        print(f"An error occurred while parsing Markdown: {e}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+def iter_regions(md_data: ProcessedData) -> Iterator[Region]:
+    """按先序（省、其下各市、各市下区县）遍历全部区域"""
+    for province in md_data:
+        yield province
+        for city in province.children:
+            yield city
+            yield from city.children
+
+SHAPEFILE_PATHS = {
+    "country": COUNTRY_SHP_PATH,
+    "province": PROVINCE_SHP_PATH,
+    "city": CITY_SHP_PATH,
+    "district": DISTRICT_SHP_PATH,
+}
+
+LEVEL_LAYERS = {0: "country", 1: "province", 2: "city", 3: "district"}
+LAYER_LEVELS = {layer: level for level, layer in LEVEL_LAYERS.items()}
+ADCODE_COLUMNS = {"country": "cn_adcode", "province": "pr_adcode", "city": "ct_adcode", "district": "dt_adcode"}
+NAME_COLUMNS = {"country": "cn_name", "province": "pr_name", "city": "ct_name", "district": "dt_name"}
+LAYER_PARENT_COLUMNS = {"province": "cn_adcode", "city": "pr_adcode", "district": "ct_adcode"}
+
+# 各图层只读取用到的列：自身 adcode/名称及上级 adcode。
+# adcode 存为 int64（无法转换时保留字符串），名称存为 Arrow 字符串（没有 pyarrow 时为 category）
+LAYER_SCHEMAS = {
+    "country": {"cn_adcode": "adcode", "cn_name": "name"},
+    "province": {"pr_adcode": "adcode", "pr_name": "name", "cn_adcode": "adcode"},
+    "city": {"ct_adcode": "adcode", "ct_name": "name", "pr_adcode": "adcode"},
+    "district": {"dt_adcode": "adcode", "dt_name": "name", "ct_adcode": "adcode"},
+}
+try:
+    import pyarrow  # noqa: F401
+    NAME_DTYPE = "string[pyarrow]"
+except ImportError:
+    NAME_DTYPE = "category"
+
+def compact_layer_dtypes(gdf: gpd.GeoDataFrame, schema: Dict[str, str]) -> gpd.GeoDataFrame:
+    """按图层 schema 压缩列类型"""
+    for column, kind in schema.items():
+        if column not in gdf.columns:
+            continue
+        if kind == "adcode":
+            try:
+                gdf[column] = gdf[column].astype("int64")
+            except (ValueError, TypeError) as e:
+                print(f"Keeping '{column}' as strings: {e}")
+        else:
+            gdf[column] = gdf[column].astype(NAME_DTYPE)
+    return gdf
+
+# 读取引擎按顺序尝试：pyogrio + Arrow（需要 pyarrow）最快，不可用时依次退回；第三项为引擎依赖的模块
+SHAPEFILE_READ_ENGINES = [
+    ("pyogrio+arrow", {"engine": "pyogrio", "use_arrow": True}, ("pyogrio", "pyarrow")),
+    ("pyogrio", {"engine": "pyogrio"}, ("pyogrio",)),
+    ("default", {}, ()),
+]
+
+def available_read_engines() -> List[Tuple[str, Dict[str, Any]]]:
+    """依赖已安装的读取引擎；只检查模块是否存在，不导入"""
+    return [(engine, options) for engine, options, modules in SHAPEFILE_READ_ENGINES
+            if all(importlib.util.find_spec(module) is not None for module in modules)]
+
+class GeoDataStore:
+    """进程内共享的shapefile图层仓库：每个图层按需加载且只读取一次，不同图层可并行读取。
+
+    已转换为 FlatGeobuf 且源文件未变化时优先读取转换后的文件；否则读取 shapefile 并（convert_on_load 时）顺便转换。
+    """
+    def __init__(self, layer_paths: Dict[str, str], converted_dir: Optional[str] = CONVERTED_LAYER_DIR,
+                 convert_on_load: bool = True, archives: Optional[Dict[str, str]] = None,
+                 extract_dir: str = EXTRACTED_MAPS_DIR):
+        self.layer_paths = dict(layer_paths)
+        self.archives = dict(archives or {})
+        self.extract_dir = extract_dir
+        self._archive_lock = threading.Lock()
+        self.converted_dir = converted_dir
+        self.convert_on_load = convert_on_load and converted_dir is not None
+        self.load_timings: Dict[str, float] = {}
+        self.load_engines: Dict[str, str] = {}
+        self._layers: Dict[str, Optional[gpd.GeoDataFrame]] = {}
+        self._locks = {layer: threading.Lock() for layer in self.layer_paths}
+        self._read_engines = available_read_engines()
+
+    def get(self, layer: str, default: Optional[gpd.GeoDataFrame] = None) -> Optional[gpd.GeoDataFrame]:
+        """获取图层，首次访问时才从磁盘读取"""
+        # 每个图层各有一把锁；已加载的图层不必等待锁
+        if layer not in self._layers:
+            lock = self._locks.get(layer)
+            if lock is None:
+                return default
+            with lock:
+                if layer not in self._layers:
+                    self._layers[layer] = self._read_layer(layer)
+        gdf = self._layers[layer]
+        return gdf if gdf is not None else default
+
+    def _read_layer(self, layer: str) -> Optional[gpd.GeoDataFrame]:
+        path = self.source_path(layer)
+        if path is None:
+            return None
+        start = time.perf_counter()
+        schema = LAYER_SCHEMAS.get(layer)
+        columns = list(schema) if schema else None
+        gdf = None
+        if self.is_converted(layer):
+            gdf = self._read_converted(layer, columns=columns)
+        if gdf is None:
+            gdf = self._read_with_engines(layer, path, columns=columns)
+            if gdf is None:
+                return None
+            if self.convert_on_load:
+                self.convert_layer(layer, gdf)
+        if schema:
+            gdf = compact_layer_dtypes(gdf, schema)
+        # 按上级adcode稳定排序（保留原索引标签），使同一上级的下级区域占据连续的行
+        parent_column = LAYER_PARENT_COLUMNS.get(layer)
+        if parent_column in gdf.columns:
+            gdf = gdf.sort_values(parent_column, kind="stable")
+        self.load_timings[layer] = time.perf_counter() - start
+        return gdf
+
+    def _read_with_engines(self, layer: str, path: str, **kwargs) -> Optional[gpd.GeoDataFrame]:
+        """依次尝试已安装的读取引擎读取文件，记录成功的引擎；某个文件读取失败不影响其他图层使用该引擎"""
+        for engine, options in self._read_engines:
+            try:
+                gdf = gpd.read_file(path, **options, **kwargs)
+            except Exception as e:
+                print(f"Error loading shapefile '{path}' with engine '{engine}': {e}")
+                continue
+            self.load_engines[layer] = f"{engine}, fgb" if path.endswith(".fgb") else engine
+            return gdf
+        return None
+
+    # --- 源 shapefile（必要时从 .7z 解压） ---
+    def source_path(self, layer: str) -> Optional[str]:
+        """图层 shapefile 的实际路径：优先使用已解压的文件，否则使用从压缩包解压到缓存的副本"""
+        path = self.layer_paths.get(layer)
+        if not path:
+            return None
+        if os.path.exists(path):
+            return path
+        archive = self.archives.get(layer)
+        if archive and os.path.exists(archive):
+            return self._extracted_path(path, archive)
+        return None
+
+    def _extracted_path(self, path: str, archive: str) -> Optional[str]:
+        # 压缩包内的路径与 maps 目录下的相对路径一致，例如 3.City/city.shp
+        target = os.path.join(self.extract_dir, os.path.relpath(path, os.path.dirname(archive)))
+        meta_path = os.path.join(self.extract_dir, os.path.basename(archive) + ".meta")
+        with self._archive_lock:
+            try:
+                meta = read_versioned_pickle(meta_path, EXTRACTED_MAPS_MAGIC, EXTRACTED_MAPS_VERSION)
+                current = _verify_sources(meta["sources"], {"archive": archive}) if meta is not None else None
+                if current is not None and os.path.exists(target):
+                    refresh_cache_sources(meta_path, EXTRACTED_MAPS_MAGIC, EXTRACTED_MAPS_VERSION, meta, current)
+                    return target
+            except Exception as e:
+                print(f"Error checking extracted archive '{archive}': {e}")
+            if py7zr is None:
+                print(f"'{path}' not found and py7zr is not installed; install py7zr or extract '{archive}' manually.")
+                return None
+            start = time.perf_counter()
+            try:
+                os.makedirs(self.extract_dir, exist_ok=True)
+                sources = _fingerprint_sources({"archive": archive})
+                with tempfile.TemporaryDirectory(dir=self.extract_dir) as tmp_dir:
+                    with py7zr.SevenZipFile(archive, mode='r') as z:
+                        members = z.getnames()
+                        z.extractall(path=tmp_dir)
+                    # 逐个顶层目录替换旧的解压结果
+                    for top in sorted({name.replace('\\', '/').split('/')[0] for name in members}):
+                        dest = os.path.join(self.extract_dir, top)
+                        if os.path.isdir(dest):
+                            shutil.rmtree(dest)
+                        elif os.path.exists(dest):
+                            os.remove(dest)
+                        os.replace(os.path.join(tmp_dir, top), dest)
+                write_versioned_pickle(meta_path, EXTRACTED_MAPS_MAGIC, EXTRACTED_MAPS_VERSION, {"sources": sources})
+            except Exception as e:
+                print(f"Error extracting map archive '{archive}': {e}")
+                return None
+            print(f"Extracted '{archive}' in {time.perf_counter() - start:.3f}s")
+            return target if os.path.exists(target) else None
+
+    # --- 转换后的 FlatGeobuf 图层 ---
+    def converted_path(self, layer: str) -> Optional[str]:
+        if self.converted_dir is None:
+            return None
+        return os.path.join(self.converted_dir, f"{layer}.fgb")
+
+    def _converted_meta_path(self, layer: str) -> str:
+        return os.path.join(self.converted_dir, f"{layer}.meta")
+
+    def _source_files(self, layer: str) -> Dict[str, str]:
+        shp_path = self.source_path(layer) or self.layer_paths[layer]
+        return {"shp": shp_path, "dbf": os.path.splitext(shp_path)[0] + ".dbf"}
+
+    def is_converted(self, layer: str) -> bool:
+        """转换后的文件存在且对应的 shapefile 未变化"""
+        path = self.converted_path(layer)
+        if path is None or not os.path.exists(path):
+            return False
+        try:
+            meta_path = self._converted_meta_path(layer)
+            meta = read_versioned_pickle(meta_path, CONVERTED_LAYER_MAGIC, CONVERTED_LAYER_VERSION)
+            current = _verify_sources(meta["sources"], self._source_files(layer)) if meta is not None else None
+            if current is None:
+                return False
+            refresh_cache_sources(meta_path, CONVERTED_LAYER_MAGIC, CONVERTED_LAYER_VERSION, meta, current)
+            return True
+        except Exception as e:
+            print(f"Error checking converted layer '{layer}': {e}")
+            return False
+
+    def _read_converted(self, layer: str, columns: Optional[List[str]] = None, **kwargs) -> Optional[gpd.GeoDataFrame]:
+        if columns is not None:
+            columns = list(columns) + [SOURCE_ROW_COLUMN]
+        gdf = self._read_with_engines(layer, self.converted_path(layer), columns=columns, **kwargs)
+        if gdf is None or SOURCE_ROW_COLUMN not in gdf.columns:
+            return None
+        # 恢复 shapefile 中的行顺序和索引标签
+        gdf = gdf.set_index(SOURCE_ROW_COLUMN).sort_index()
+        gdf.index.name = None
+        return gdf
+
+    def convert_layer(self, layer: str, gdf: Optional[gpd.GeoDataFrame] = None) -> bool:
+        """把图层写为带打包空间索引的 FlatGeobuf；gdf 为已读取的 shapefile 数据（索引为原行号，只含 schema 中的列）"""
+        path = self.converted_path(layer)
+        if path is None:
+            return False
+        try:
+            if gdf is None:
+                source = self.source_path(layer)
+                schema = LAYER_SCHEMAS.get(layer)
+                gdf = self._read_with_engines(layer, source, columns=list(schema) if schema else None) if source else None
+                if gdf is None:
+                    return False
+            os.makedirs(self.converted_dir, exist_ok=True)
+            sources = _fingerprint_sources(self._source_files(layer))
+            out = gdf.sort_index()
+            out[SOURCE_ROW_COLUMN] = out.index.to_numpy()
+            tmp_path = f"{path}.{os.getpid()}.tmp.fgb"
+            # 不把 Polygon 提升为 MultiPolygon，保证读回的几何与 shapefile 完全一致
+            out.to_file(tmp_path, driver="FlatGeobuf", engine="pyogrio", promote_to_multi=False, SPATIAL_INDEX="YES")
+            os.replace(tmp_path, path)
+            write_versioned_pickle(self._converted_meta_path(layer), CONVERTED_LAYER_MAGIC, CONVERTED_LAYER_VERSION,
+                                   {"sources": sources})
+            return True
+        except Exception as e:
+            print(f"Error converting layer '{layer}' to FlatGeobuf: {e}")
+            return False
+
+    def read_subset(self, layer: str, columns: Optional[List[str]] = None,
+                    bbox: Optional[Tuple[float, float, float, float]] = None) -> Optional[gpd.GeoDataFrame]:
+        """只读取部分列（转换后的文件只含 LAYER_SCHEMAS 中的列）和/或某个范围内的要素，
+        已转换时利用空间索引；不影响已加载的完整图层"""
+        if self.is_converted(layer):
+            return self._read_converted(layer, columns=columns, bbox=bbox)
+        source = self.source_path(layer)
+        if source is None:
+            return None
+        return self._read_with_engines(layer, source, columns=columns, bbox=bbox)
+
+    def __getitem__(self, layer: str) -> gpd.GeoDataFrame:
+        gdf = self.get(layer)
+        if gdf is None:
+            raise KeyError(layer)
+        return gdf
+
+    def __contains__(self, layer: str) -> bool:
+        return self.get(layer) is not None
+
+    def load_all(self, layers: Optional[Iterable[str]] = None,
+                 on_loaded: Optional[Callable[[str], None]] = None) -> Dict[str, gpd.GeoDataFrame]:
+        """在线程池中并行加载图层（默认全部），每个图层完成时调用 on_loaded，返回成功加载的图层字典"""
+        layers = list(self.layer_paths if layers is None else layers)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(layers))) as executor:
+            futures = {executor.submit(self.get, layer): layer for layer in layers}
+            for future in as_completed(futures):
+                if on_loaded:
+                    on_loaded(futures[future])
+        self.load_timings["wall"] = time.perf_counter() - start
+        return {layer: self._layers[layer] for layer in layers if self._layers.get(layer) is not None}
+
+    def format_load_timings(self) -> str:
+        """各图层加载耗时（及所用引擎）的摘要文本"""
+        layer_timings = [(layer, seconds) for layer, seconds in self.load_timings.items() if layer != "wall"]
+        if not layer_timings:
+            return "No shapefile layers loaded."
+        parts = [f"{layer} {seconds:.3f}s [{self.load_engines.get(layer, '?')}]" for layer, seconds in layer_timings]
+        total = sum(seconds for _, seconds in layer_timings)
+        summary = f"Shapefile load timings: {', '.join(parts)} (sum {total:.3f}s"
+        if "wall" in self.load_timings:
+            summary += f", parallel wall {self.load_timings['wall']:.3f}s"
+        return summary + ")"
+
+_geo_data_store: Optional[GeoDataStore] = None
+
+def get_geo_data_store() -> GeoDataStore:
+    """获取进程内唯一的GeoDataStore实例"""
+    global _geo_data_store
+    if _geo_data_store is None:
+        _geo_data_store = GeoDataStore(SHAPEFILE_PATHS, archives=SHAPEFILE_ARCHIVES)
+    return _geo_data_store
+
+def load_shapefiles() -> Dict[str, gpd.GeoDataFrame]:
+    return get_geo_data_store().load_all()
+
+def normalize_name(name: str) -> str:
+    if name is None:
+        return ""
+    return name.strip() # 仅去除前后空格，不再移除后缀
+
+def build_row_lookup(gdf: gpd.GeoDataFrame, name_column: str, parent_column: Optional[str] = None) -> Dict[tuple, int]:
+    """建立 (上级adcode, 标准化名称) -> 行位置 的索引；同名时保留第一行，与 iloc[0] 语义一致"""
+    names = [normalize_name(name) for name in gdf[name_column].astype(str)]
+    parents = gdf[parent_column].tolist() if parent_column else [None] * len(names)
+    lookup: Dict[tuple, int] = {}
+    for position, key in enumerate(zip(parents, names)):
+        lookup.setdefault(key, position)
+    return lookup
+
+class RegionIndex:
+    """行政区划查找表，每个图层首次使用时建立一次：
+    adcode -> 行位置、上级adcode -> 下级行区间、(上级adcode, 名称) -> 行位置，以及 (级别, adcode) -> Region。
+
+    下级行区间依赖 GeoDataStore 按上级adcode排序后的行顺序。
+    """
+    def __init__(self, shp_data: ShapefileData):
+        self.shp_data = shp_data
+        self._rows: Dict[str, Dict[Any, int]] = {}
+        self._child_ranges: Dict[str, Dict[Any, Tuple[int, int]]] = {}
+        self._name_rows: Dict[Tuple[str, bool], Dict[tuple, int]] = {}
+        # 省直辖县级市等可能以同一 adcode 同时作为市和区县出现，按级别分开登记
+        self._regions: Dict[Tuple[int, Any], Region] = {}
+        self._lock = threading.Lock()
+
+    def row(self, layer: str, adcode: Any) -> Optional[int]:
+        """adcode 在图层中的行位置（重复时取第一行）"""
+        with self._lock:
+            if layer not in self._rows:
+                rows: Dict[Any, int] = {}
+                for position, value in enumerate(self.shp_data[layer][ADCODE_COLUMNS[layer]].tolist()):
+                    rows.setdefault(value, position)
+                self._rows[layer] = rows
+        return self._rows[layer].get(adcode)
+
+    def children_slice(self, layer: str, parent_adcode: Any) -> slice:
+        """图层中上级adcode为 parent_adcode 的行区间，没有时为空区间"""
+        with self._lock:
+            if layer not in self._child_ranges:
+                ranges: Dict[Any, Tuple[int, int]] = {}
+                parents = self.shp_data[layer][LAYER_PARENT_COLUMNS[layer]].tolist()
+                start = 0
+                for position in range(1, len(parents) + 1):
+                    if position == len(parents) or parents[position] != parents[start]:
+                        ranges.setdefault(parents[start], (start, position))
+                        start = position
+                self._child_ranges[layer] = ranges
+        start, stop = self._child_ranges[layer].get(parent_adcode, (0, 0))
+        return slice(start, stop)
+
+    def children_rows(self, layer: str, parent_adcode: Any) -> gpd.GeoDataFrame:
+        return self.shp_data[layer].iloc[self.children_slice(layer, parent_adcode)]
+
+    def find_row(self, layer: str, name: str, parent_adcode: Any = None) -> Optional[int]:
+        """按标准化名称（及上级adcode）查找行位置，同名时取第一行"""
+        key = (layer, parent_adcode is not None)
+        with self._lock:
+            if key not in self._name_rows:
+                parent_column = LAYER_PARENT_COLUMNS[layer] if parent_adcode is not None else None
+                self._name_rows[key] = build_row_lookup(self.shp_data[layer], NAME_COLUMNS[layer], parent_column)
+        return self._name_rows[key].get((parent_adcode, name))
+
+    def region(self, level: int, adcode: Any) -> Optional[Region]:
+        return self._regions.get((level, adcode))
+
+    def add_region(self, region: Region):
+        if region.adcode is not None:
+            self._regions.setdefault((region.level, region.adcode), region)
+
+    def register_regions(self, md_data: ProcessedData):
+        """登记已链接区域的 (级别, adcode) -> Region"""
+        for region in iter_regions(md_data):
+            self.add_region(region)
+
+_region_index: Optional[RegionIndex] = None
+
+def get_region_index() -> RegionIndex:
+    """获取基于共享 GeoDataStore 的区划查找表"""
+    global _region_index
+    if _region_index is None:
+        _region_index = RegionIndex(get_geo_data_store())
+    return _region_index
+
+def link_data(md_data: ProcessedData, shp_data: ShapefileData,
+              region_index: Optional[RegionIndex] = None) -> ProcessedData:
+    # print("--- Inside link_data ---") # 移除调试打印
+    essential_shp_loaded_and_not_empty = (
+        "province" in shp_data and shp_data["province"] is not None and not shp_data["province"].empty and
+        "city" in shp_data and shp_data["city"] is not None and not shp_data["city"].empty and
+        "district" in shp_data and shp_data["district"] is not None and not shp_data["district"].empty
+    )
+    if not md_data or not essential_shp_loaded_and_not_empty:
+        # print("Missing or empty data for linking. Aborting linking.") # 移除调试打印
+        return md_data
+    # print("Preconditions PASSED. Proceeding with linking logic...") # 移除调试打印
+
+    gdf_provinces = shp_data["province"]
+    gdf_cities = shp_data["city"]
+    gdf_districts = shp_data["district"]
+
+    # 通过查找表按 (上级adcode, 标准化名称) 取行号，替代逐行布尔筛选
+    if region_index is None:
+        region_index = RegionIndex(shp_data)
+
+    # tolist() 得到 Python int（或字符串），Region 中不保存 numpy 标量
+    province_adcodes = gdf_provinces["pr_adcode"].tolist()
+    city_adcodes = gdf_cities["ct_adcode"].tolist()
+    district_adcodes = gdf_districts["dt_adcode"].tolist()
+    province_geoms = gdf_provinces.geometry.to_numpy()
+    city_geoms = gdf_cities.geometry.to_numpy()
+    district_geoms = gdf_districts.geometry.to_numpy()
+
+    # 链接所有层级的自身adcode和geometry
+    for province_md in md_data:
+        row = region_index.find_row("province", province_md.name.strip())
+        if row is not None:
+            province_md.adcode = province_adcodes[row]
+            province_md.geometry = province_geoms[row]
+            region_index.add_region(province_md) # 登记已链接的省份
+
+        for city_md in province_md.children:
+            # 使用已链接的省份adcode进行查找
+            parent_province_adcode = province_md.adcode
+            if parent_province_adcode is None:
+                continue
+
+            row = region_index.find_row("city", city_md.name.strip(), parent_province_adcode)
+            if row is not None:
+                city_md.adcode = city_adcodes[row]
+                city_md.geometry = city_geoms[row]
+                region_index.add_region(city_md) # 登记已链接的城市
+
+            for district_md in city_md.children:
+                # 使用已链接的城市adcode进行查找
+                parent_city_adcode = city_md.adcode
+                if parent_city_adcode is None:
+                    continue
+
+                row = region_index.find_row("district", district_md.name.strip(), parent_city_adcode)
+                if row is not None:
+                    district_md.adcode = district_adcodes[row]
+                    district_md.geometry = district_geoms[row]
+                    region_index.add_region(district_md) # 登记已链接的区县
+
+    # parent_adcode 由 Region 根据上级的链接结果直接给出，不再需要第二遍填充
+    # print("--- Data linking loop finished. ---") # 移除调试打印
+    return md_data
+
+# --- 预编译数据集缓存 ---
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _source_mtime_ns(path: str, stat: os.stat_result) -> int:
+    """源文件指纹中的修改时间。打包后随程序发布的文件每次启动都重新解压、修改时间总是新的，
+    其内容只会随可执行文件一起变化，因此改用可执行文件的修改时间，避免每次启动都重新计算哈希"""
+    if getattr(sys, 'frozen', False) and os.path.abspath(path).startswith(os.path.join(SCRIPT_DIR, "")):
+        return os.stat(sys.executable).st_mtime_ns
+    return stat.st_mtime_ns
+
+def dataset_cache_sources() -> Dict[str, str]:
+    """参与缓存校验的源文件：output.md 以及省/市/区县的 .shp/.dbf"""
+    sources = {"markdown": MD_FILE_PATH}
+    store = get_geo_data_store()
+    for layer in ("province", "city", "district"):
+        shp_path = store.source_path(layer) or SHAPEFILE_PATHS[layer]
+        sources[f"{layer}.shp"] = shp_path
+        sources[f"{layer}.dbf"] = os.path.splitext(shp_path)[0] + ".dbf"
+    return sources
+
+def _fingerprint_sources(sources: Dict[str, str]) -> Dict[str, tuple]:
+    fingerprints = {}
+    for key, path in sources.items():
+        stat = os.stat(path)
+        fingerprints[key] = (stat.st_size, _source_mtime_ns(path, stat), _file_digest(path))
+    return fingerprints
+
+def _verify_sources(stored: Dict[str, tuple], sources: Dict[str, str]) -> Optional[Dict[str, tuple]]:
+    """先比较大小和修改时间；只有修改时间变化时才重新计算哈希。
+
+    源文件有变化时返回 None，否则返回带当前修改时间的指纹。内容未变而修改时间变了（checkout、复制、touch）时，
+    返回值与 stored 不同，调用方应把它写回缓存，避免以后每次启动都重新计算哈希。
+    """
+    if set(stored) != set(sources):
+        return None
+    current = {}
+    for key, path in sources.items():
+        if not os.path.exists(path):
+            return None
+        size, mtime_ns, digest = stored[key]
+        stat = os.stat(path)
+        if stat.st_size != size:
+            return None
+        current_mtime_ns = _source_mtime_ns(path, stat)
+        if current_mtime_ns != mtime_ns and _file_digest(path) != digest:
+            return None
+        current[key] = (size, current_mtime_ns, digest)
+    return current
+
+def _flatten_regions(md_data: ProcessedData):
+    """按先序遍历把区域树展开为记录列表和几何体列表，父节点用记录下标表示"""
+    records = []
+    geometries = []
+
+    def visit(region: Region, parent_index: int):
+        records.append((
+            region.level, region.name, parent_index, region.adcode,
+            region.general_spans, region.detail_spans,
+        ))
+        geometries.append(region.geometry)
+        index = len(records) - 1
+        for child in region.children:
+            visit(child, index)
+
+    for province in md_data:
+        visit(province, -1)
+    return records, geometries
+
+def _rebuild_regions(records: List[tuple], geometries, text_source: MarkdownTextSource) -> ProcessedData:
+    processed_data: ProcessedData = []
+    regions: List[Region] = []
+    for (level, name, parent_index, adcode, general_spans, detail_spans), geometry in zip(records, geometries):
+        parent = regions[parent_index] if parent_index >= 0 else None
+        region = Region(name, level, parent, text_source)
+        region.adcode = adcode
+        region.general_spans = general_spans
+        region.detail_spans = detail_spans
+        region.geometry = geometry
+        if parent is None:
+            processed_data.append(region)
+        else:
+            parent.children.append(region)
+        regions.append(region)
+    return processed_data
+
+def write_versioned_pickle(path: str, magic: bytes, version: int, payload: Any):
+    """写入带魔数和版本号的 pickle 文件（先写临时文件再替换，避免留下半个文件）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 每次写入使用独立的临时文件，多个进程或线程同时写同一缓存时不会互相覆盖
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(magic + struct.pack("<H", version))
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_versioned_pickle(path: str, magic: bytes, version: int) -> Optional[Any]:
+    """读取 write_versioned_pickle 写入的文件；文件不存在或版本不符时返回 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        if f.read(len(magic) + 2) != magic + struct.pack("<H", version):
+            return None
+        return pickle.load(f)
+
+def save_dataset_cache(cache_path: str, sources: Dict[str, str], md_data: ProcessedData):
+    """把解析并链接后的区域树写入单个二进制缓存文件（几何体保存为WKB）"""
+    try:
+        records, geometries = _flatten_regions(md_data)
+        payload = {
+            "sources": _fingerprint_sources(sources),
+            "records": records,
+            "wkb": list(shapely.to_wkb(geometries)),
+        }
+        write_versioned_pickle(cache_path, DATASET_CACHE_MAGIC, DATASET_CACHE_VERSION, payload)
+    except Exception as e:
+        print(f"Error writing dataset cache '{cache_path}': {e}")
+
+def refresh_cache_sources(path: str, magic: bytes, version: int, payload: Dict[str, Any], current: Dict[str, tuple]):
+    """源文件内容未变、只有修改时间变化时，把新的修改时间写回缓存文件"""
+    if current == payload["sources"]:
+        return
+    payload["sources"] = current
+    try:
+        write_versioned_pickle(path, magic, version, payload)
+    except Exception as e:
+        print(f"Error refreshing cache '{path}': {e}")
+
+def load_dataset_cache(cache_path: str, sources: Dict[str, str]) -> Optional[ProcessedData]:
+    """源文件未变化时直接从缓存恢复区域树，否则返回 None"""
+    try:
+        payload = read_versioned_pickle(cache_path, DATASET_CACHE_MAGIC, DATASET_CACHE_VERSION)
+        current = _verify_sources(payload["sources"], sources) if payload is not None else None
+        if current is None:
+            return None
+        refresh_cache_sources(cache_path, DATASET_CACHE_MAGIC, DATASET_CACHE_VERSION, payload, current)
+        geometries = shapely.from_wkb(payload["wkb"])
+        # 缓存已校验 output.md 未变化，记录的文本字节区间仍然有效
+        text_source = get_markdown_text_source(sources["markdown"])
+        return _rebuild_regions(payload["records"], geometries, text_source)
+    except Exception as e:
+        print(f"Error reading dataset cache '{cache_path}': {e}")
+        return None
+
+LAYER_TITLES = {"country": "国界", "province": "省级", "city": "市级", "district": "区县级"}
+
+def main_data_processing(progress: Optional[Callable[[int, str], None]] = None,
+                         on_parsed: Optional[Callable[[ProcessedData], None]] = None):
+    """解析、加载并链接数据；progress(百分比, 说明) 报告进度，on_parsed 在区域树可用（尚未链接地图）时调用"""
+    report = progress or (lambda percent, message: None)
+    # print("--- Entering main_data_processing ---") # 移除调试打印
+    # 源文件未变化时跳过 Markdown 解析和 shapefile 链接
+    report(5, "正在读取数据缓存...")
+    cache_sources = dataset_cache_sources()
+    cached_data = load_dataset_cache(DATASET_CACHE_PATH, cache_sources)
+    if cached_data:
+        get_region_index().register_regions(cached_data)
+        if on_parsed:
+            on_parsed(cached_data)
+        return cached_data
+    # print("--- Calling parse_markdown ---") # 移除调试打印
+    report(10, "正在解析沿革文本...")
+    parsed_md = parse_markdown(MD_FILE_PATH)
+    # print(f"--- Returned from parse_markdown. parsed_md is {'None or empty' if not parsed_md else 'Populated'} ---") # 移除调试打印
+    if not parsed_md:
+        print("Markdown parsing failed. Exiting.")
+        return None
+    if on_parsed:
+        on_parsed(parsed_md)
+    # print("--- Calling load_shapefiles ---") # 移除调试打印
+    shapefile_data = get_geo_data_store()
+    # print(f"--- Returned from load_shapefiles. shapefile_data keys: {list(shapefile_data.keys()) if shapefile_data else 'None or empty'} ---") # 移除调试打印
+    required_shp_keys = ["country", "province", "city", "district"]
+    report(20, "正在并行加载地图图层...")
+    loaded_keys: List[str] = []
+    def on_layer_loaded(key: str):
+        loaded_keys.append(key)
+        report(20 + len(loaded_keys) * 12, f"已加载{LAYER_TITLES[key]}地图")
+    shapefile_data.load_all(required_shp_keys, on_layer_loaded)
+    missing_keys = [key for key in required_shp_keys if key not in shapefile_data or shapefile_data[key].empty]
+    if missing_keys:
+        print(f"Shapefile loading incomplete or essential shapefiles are empty. Missing/Empty keys: {missing_keys}. Exiting.")
+        return None
+    # print("--- Calling link_data ---") # 移除调试打印
+    report(70, "正在匹配行政区划与地图...")
+    linked_data_structure = link_data(parsed_md, shapefile_data, get_region_index())
+    # print("--- Returned from link_data ---") # 移除调试打印
+    save_dataset_cache(DATASET_CACHE_PATH, cache_sources, linked_data_structure)
+    return linked_data_structure
+
+# --- 搜索索引 ---
+MIN_QUERY_LENGTH = 2  # 与搜索框提示一致：至少2个字
+
+def iter_bigrams(text: str) -> Iterator[str]:
+    for i in range(len(text) - 1):
+        yield text[i:i + 2]
+
+class NameSearchIndex:
+    """地名的字符二元组（bigram）倒排索引，子串查询通过倒排表求交完成"""
+    def __init__(self, md_data: ProcessedData):
+        self.regions: List[Region] = list(iter_regions(md_data))
+        self._postings: Dict[str, List[int]] = {}
+        for region_id, region in enumerate(self.regions):
+            for bigram in set(iter_bigrams(region.name)):
+                self._postings.setdefault(bigram, []).append(region_id)
+
+    def search(self, query: str) -> List[Region]:
+        """返回名称包含 query 的区域，顺序与区域树的先序遍历一致"""
+        return [region for batch in self.iter_search(query, len(self.regions) or 1) for region in batch]
+
+    def iter_search(self, query: str, batch_size: int) -> Iterator[List[Region]]:
+        """与 search 相同，但每校验出 batch_size 个结果就产出一批，供后台搜索边查边送回界面"""
+        if len(query) < MIN_QUERY_LENGTH:
+            candidates: Iterable[int] = range(len(self.regions))
+        else:
+            postings = []
+            for bigram in set(iter_bigrams(query)):
+                posting = self._postings.get(bigram)
+                if not posting:
+                    return
+                postings.append(posting)
+            postings.sort(key=len)
+
+            candidate_set = set(postings[0])
+            for posting in postings[1:]:
+                candidate_set.intersection_update(posting)
+                if not candidate_set:
+                    return
+            candidates = sorted(candidate_set)
+
+        # 二元组都出现不代表连续出现，最后再做一次子串校验
+        batch = []
+        for region_id in candidates:
+            region = self.regions[region_id]
+            if query in region.name:
+                batch.append(region)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+# --- 全文检索 ---
+FULLTEXT_GENERAL_BOOST = 1.5  # 概述（上位类说明）中的命中权重更高
+FULLTEXT_SNIPPET_RADIUS = 30
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+class FullTextHit:
+    """全文检索结果：命中的区域、相关度得分和上下文摘要"""
+    __slots__ = ("region", "score", "snippet")
+
+    def __init__(self, region: Region, score: float, snippet: str):
+        self.region = region
+        self.score = score
+        self.snippet = snippet
+
+def _region_doc_keys(md_data: ProcessedData) -> Iterator[Tuple[tuple, Region]]:
+    """为每个区域生成稳定的文档键：名称路径，同名同级时追加序号"""
+    seen: Dict[tuple, int] = {}
+    for region in iter_regions(md_data):
+        path = []
+        node = region
+        while node is not None:
+            path.append(node.name)
+            node = node.parent
+        path = tuple(reversed(path))
+        ordinal = seen.get(path, 0)
+        seen[path] = ordinal + 1
+        yield path + (ordinal,), region
+
+def _region_text_digest(region: Region) -> str:
+    """直接对 output.md 中的原始字节求哈希，无需解码文本"""
+    data = region.text_source.buffer()
+    digest = hashlib.sha1()
+    for spans in (region.general_spans, region.detail_spans):
+        for block in spans:
+            for i in range(0, len(block), 2):
+                digest.update(data[block[i]:block[i] + block[i + 1]])
+            digest.update(b"\0")
+        digest.update(b"\1")
+    return digest.hexdigest()
+
+def _text_bigrams(text: str) -> set:
+    bigrams = set()
+    for line in text.split("\n"):
+        bigrams.update(iter_bigrams(line))
+    return bigrams
+
+class FullTextIndex:
+    """沿革文本（text_general/text_detail）的 bigram 倒排索引。
+
+    索引持久化在 CACHE_DIR 中；output.md 变化后只重新索引文本有改动的区域。
+    """
+    PERSISTED_FIELDS = ("terms", "postings", "doc_keys", "doc_digests", "doc_terms", "doc_lengths", "source_stat")
+
+    def __init__(self):
+        self.terms: Dict[str, int] = {}          # bigram -> 词项编号
+        self.postings: List[array] = []          # 词项编号 -> 有序文档编号
+        self.doc_keys: List[Optional[tuple]] = []  # 文档编号 -> 文档键，None 表示空位
+        self.doc_digests: List[Optional[str]] = []
+        self.doc_terms: List[array] = []         # 文档编号 -> 所含词项，用于增量删除
+        self.doc_lengths = array('I')
+        self.source_stat: Optional[tuple] = None  # output.md 的 (大小, 修改时间)
+        # 以下为运行时状态，不写入磁盘
+        self._regions: List[Optional[Region]] = []
+        self._free_doc_ids: List[int] = []
+        self._doc_count = 0
+        self._average_length = 1.0
+
+    @classmethod
+    def load_or_build(cls, index_path: str, md_data: ProcessedData) -> "FullTextIndex":
+        """读取磁盘上的索引并与当前数据同步，有变化时写回"""
+        index = cls()
+        try:
+            payload = read_versioned_pickle(index_path, FULLTEXT_INDEX_MAGIC, FULLTEXT_INDEX_VERSION)
+            if payload is not None:
+                for field in cls.PERSISTED_FIELDS:
+                    setattr(index, field, payload[field])
+        except Exception as e:
+            print(f"Error reading full-text index '{index_path}': {e}")
+            index = cls()
+        if index._sync(md_data):
+            index.save(index_path)
+        return index
+
+    def save(self, index_path: str):
+        payload = {field: getattr(self, field) for field in self.PERSISTED_FIELDS}
+        try:
+            write_versioned_pickle(index_path, FULLTEXT_INDEX_MAGIC, FULLTEXT_INDEX_VERSION, payload)
+        except Exception as e:
+            print(f"Error writing full-text index '{index_path}': {e}")
+
+    def _sync(self, md_data: ProcessedData) -> bool:
+        """把索引与区域树对齐，返回索引内容是否发生变化"""
+        regions_by_key = dict(_region_doc_keys(md_data))
+        text_source = next((r.text_source for r in regions_by_key.values() if r.text_source), None)
+        source_stat = None
+        if text_source is not None and os.path.exists(text_source.md_filepath):
+            stat = os.stat(text_source.md_filepath)
+            source_stat = (stat.st_size, _source_mtime_ns(text_source.md_filepath, stat))
+
+        live_keys = {key for key in self.doc_keys if key is not None}
+        unchanged = (source_stat is not None and source_stat == self.source_stat
+                     and live_keys == {key for key, r in regions_by_key.items() if r.general_spans or r.detail_spans})
+        changed = False
+        if not unchanged:
+            self._free_doc_ids = [doc_id for doc_id, key in enumerate(self.doc_keys) if key is None]
+            doc_ids = {key: doc_id for doc_id, key in enumerate(self.doc_keys) if key is not None}
+            for key, doc_id in doc_ids.items():
+                region = regions_by_key.get(key)
+                if region is None or not (region.general_spans or region.detail_spans) \
+                        or _region_text_digest(region) != self.doc_digests[doc_id]:
+                    self._remove_doc(doc_id)
+                    changed = True
+            live_keys = {key for key in self.doc_keys if key is not None}
+            for key, region in regions_by_key.items():
+                if key not in live_keys and (region.general_spans or region.detail_spans):
+                    self._add_doc(key, region)
+                    changed = True
+            changed = changed or source_stat != self.source_stat
+            self.source_stat = source_stat
+
+        self._regions = [regions_by_key.get(key) if key is not None else None for key in self.doc_keys]
+        live_lengths = [length for key, length in zip(self.doc_keys, self.doc_lengths) if key is not None]
+        self._doc_count = len(live_lengths)
+        self._average_length = (sum(live_lengths) / len(live_lengths)) if live_lengths else 1.0
+        return changed
+
+    def _add_doc(self, key: tuple, region: Region):
+        text = region.text_general + "\n" + region.text_detail
+        term_ids = array('I')
+        for bigram in _text_bigrams(text):
+            term_id = self.terms.get(bigram)
+            if term_id is None:
+                term_id = self.terms[bigram] = len(self.postings)
+                self.postings.append(array('I'))
+            term_ids.append(term_id)
+
+        if self._free_doc_ids:
+            doc_id = self._free_doc_ids.pop()
+            self.doc_keys[doc_id] = key
+            self.doc_digests[doc_id] = _region_text_digest(region)
+            self.doc_terms[doc_id] = term_ids
+            self.doc_lengths[doc_id] = len(text)
+        else:
+            doc_id = len(self.doc_keys)
+            self.doc_keys.append(key)
+            self.doc_digests.append(_region_text_digest(region))
+            self.doc_terms.append(term_ids)
+            self.doc_lengths.append(len(text))
+
+        for term_id in term_ids:
+            posting = self.postings[term_id]
+            if not posting or posting[-1] < doc_id:
+                posting.append(doc_id)
+            else:
+                self.postings[term_id] = array('I', sorted(set(posting) | {doc_id}))
+
+    def _remove_doc(self, doc_id: int):
+        for term_id in self.doc_terms[doc_id]:
+            posting = self.postings[term_id]
+            posting.remove(doc_id)
+        self.doc_keys[doc_id] = None
+        self.doc_digests[doc_id] = None
+        self.doc_terms[doc_id] = array('I')
+        self.doc_lengths[doc_id] = 0
+        self._free_doc_ids.append(doc_id)
+
+    def search(self, query: str, should_stop: Optional[Callable[[], bool]] = None) -> List[FullTextHit]:
+        """短语检索：倒排表求交得到候选，再读取原文确认并按 BM25 排序。
+
+        should_stop 返回 True 时放弃本次检索（用于取消过期的后台查询）。
+        """
+        hits = [hit for batch in self.iter_search(query, max(1, self._doc_count), should_stop) for hit in batch]
+        if should_stop is not None and should_stop():
+            return []
+        if hits:
+            idf = math.log(1 + (self._doc_count - len(hits) + 0.5) / (len(hits) + 0.5))
+            for hit in hits:
+                hit.score *= idf
+        hits.sort(key=lambda hit: -hit.score)
+        return hits
+
+    def iter_search(self, query: str, batch_size: int,
+                    should_stop: Optional[Callable[[], bool]] = None) -> Iterator[List[FullTextHit]]:
+        """按文档顺序逐批产出命中，供后台搜索边查边送回界面；should_stop 返回 True 时停止。
+
+        得分尚未乘以 IDF（对同一查询是常数），按得分排序的结果与 search 相同。
+        """
+        query = query.strip()
+        if len(query) < MIN_QUERY_LENGTH:
+            return
+
+        postings = []
+        for bigram in set(iter_bigrams(query)):
+            term_id = self.terms.get(bigram)
+            if term_id is None or not self.postings[term_id]:
+                return
+            postings.append(self.postings[term_id])
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+
+        batch = []
+        for checked, doc_id in enumerate(sorted(candidates)):
+            if should_stop is not None and checked % 64 == 0 and should_stop():
+                return
+            region = self._regions[doc_id]
+            if region is None:
+                continue
+            text_general = region.text_general
+            text_detail = region.text_detail
+            general_count = text_general.count(query)
+            detail_count = text_detail.count(query)
+            if not general_count and not detail_count:
+                continue
+            tf = general_count * FULLTEXT_GENERAL_BOOST + detail_count
+            length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self._average_length
+            score = tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+            if general_count:
+                snippet = self._make_snippet(text_general, text_general.find(query), len(query))
+            else:
+                snippet = self._make_snippet(text_detail, text_detail.find(query), len(query))
+            batch.append(FullTextHit(region, score, snippet))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _make_snippet(self, text: str, position: int, length: int) -> str:
+        start = max(0, position - FULLTEXT_SNIPPET_RADIUS)
+        end = min(len(text), position + length + FULLTEXT_SNIPPET_RADIUS)
+        snippet = text[start:end].replace("\n", " ")
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+# --- 多分辨率几何金字塔 ---
+PYRAMID_TOLERANCES = (0.0005, 0.002, 0.01, 0.05)  # 简化容差（度），对应金字塔第1~4级
+PYRAMID_MAX_PIXEL_ERROR = 0.75  # 简化误差不超过这么多像素时视为无可见损失
+PYRAMID_CACHE_MAGIC = b"JYZXT-PYRAMID"
+PYRAMID_CACHE_VERSION = 2
+
+class GeometryPyramid:
+    """各图层预先简化（保持拓扑）的多分辨率几何，缓存在 CACHE_DIR 中。
+
+    第0级为原始几何；第 i 级使用 PYRAMID_TOLERANCES[i-1] 简化，较粗的级别由上一级继续简化得到。
+    首次生成较慢，在后台线程中进行，完成前绘图使用原始几何。
+    """
+    def __init__(self, store: GeoDataStore, region_index: RegionIndex, cache_dir: str = CACHE_DIR,
+                 tolerances: Tuple[float, ...] = PYRAMID_TOLERANCES):
+        self.store = store
+        self.region_index = region_index
+        self.cache_dir = cache_dir
+        self.tolerances = tuple(tolerances)
+        self._levels: Dict[str, List[gpd.GeoSeries]] = {}
+        self._building: set = set()  # 正在生成或正在写入缓存文件的图层
+        self._lock = threading.Lock()
+
+    def is_ready(self, layer: str) -> bool:
+        """该图层的简化几何是否已就绪（不会触发生成）"""
+        return layer in self._levels
+
+    def wait_ready(self, layer: str, poll_interval: float = 0.1) -> bool:
+        """阻塞到该图层的简化几何就绪且已写入缓存文件（必要时开始生成），生成失败时返回 False；
+        供命令行工具在启动子进程前调用，子进程随后直接读取缓存"""
+        self._get_levels(layer)
+        while True:
+            with self._lock:
+                if layer not in self._building:
+                    return layer in self._levels
+            time.sleep(poll_interval)
+
+    def select_level(self, units_per_pixel: float) -> int:
+        """选择误差仍小于 PYRAMID_MAX_PIXEL_ERROR 像素的最粗级别"""
+        level = 0
+        for i, tolerance in enumerate(self.tolerances, start=1):
+            if tolerance <= units_per_pixel * PYRAMID_MAX_PIXEL_ERROR:
+                level = i
+        return level
+
+    def layer(self, layer: str, level: int) -> Optional[gpd.GeoSeries]:
+        """返回图层在指定级别的几何（索引与图层 GeoDataFrame 相同）；该级别尚未就绪时返回原始几何"""
+        gdf = self.store.get(layer)
+        if gdf is None:
+            return None
+        if level <= 0:
+            return gdf.geometry
+        levels = self._get_levels(layer)
+        if levels is None:
+            return gdf.geometry
+        return levels[min(level, len(levels)) - 1]
+
+    def region_geometry(self, region: Region, level: int):
+        """区域在指定级别下的几何，找不到对应行时退回区域自身的原始几何"""
+        layer = LEVEL_LAYERS.get(region.level)
+        if level <= 0 or layer is None or region.adcode is None:
+            return region.geometry
+        series = self.layer(layer, level)
+        row = self.region_index.row(layer, region.adcode)
+        if series is None or row is None:
+            return region.geometry
+        return series.iloc[row]
+
+    def _cache_path(self, layer: str) -> str:
+        return os.path.join(self.cache_dir, f"pyramid_{layer}.bin")
+
+    def _get_levels(self, layer: str) -> Optional[List[gpd.GeoSeries]]:
+        with self._lock:
+            if layer in self._levels:
+                return self._levels[layer]
+            if layer in self._building:
+                return None
+            levels = self._load_levels(layer)
+            if levels is not None:
+                self._levels[layer] = levels
+                return levels
+            self._building.add(layer)
+        threading.Thread(target=self._build_levels, args=(layer,), daemon=True).start()
+        return None
+
+    def _load_levels(self, layer: str) -> Optional[List[gpd.GeoSeries]]:
+        gdf = self.store[layer]
+        try:
+            payload = read_versioned_pickle(self._cache_path(layer), PYRAMID_CACHE_MAGIC, PYRAMID_CACHE_VERSION)
+            if payload is None or payload["tolerances"] != self.tolerances or payload["rows"] != len(gdf):
+                return None
+            current = _verify_sources(payload["sources"], {"layer": self.store.source_path(layer)})
+            if current is None:
+                return None
+            refresh_cache_sources(self._cache_path(layer), PYRAMID_CACHE_MAGIC, PYRAMID_CACHE_VERSION, payload, current)
+            return [gpd.GeoSeries(shapely.from_wkb(wkb), index=gdf.index, crs=gdf.crs) for wkb in payload["levels"]]
+        except Exception as e:
+            print(f"Error reading geometry pyramid for '{layer}': {e}")
+            return None
+
+    def _build_levels(self, layer: str):
+        gdf = self.store[layer]
+        start = time.perf_counter()
+        try:
+            geometries = gdf.geometry.to_numpy()
+            arrays = []
+            for tolerance in self.tolerances:
+                geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+                arrays.append(geometries)
+            levels = [gpd.GeoSeries(array, index=gdf.index, crs=gdf.crs) for array in arrays]
+        except Exception as e:
+            print(f"Error building geometry pyramid for '{layer}': {e}")
+            with self._lock:
+                self._building.discard(layer)
+            return
+        # 简化几何先供绘图使用；写完缓存文件后才从 _building 中移除，wait_ready 据此等待写入完成
+        with self._lock:
+            self._levels[layer] = levels
+        print(f"Built geometry pyramid for '{layer}' in {time.perf_counter() - start:.3f}s")
+        try:
+            payload = {
+                "sources": _fingerprint_sources({"layer": self.store.source_path(layer)}),
+                "tolerances": self.tolerances,
+                "rows": len(gdf),
+                "levels": [list(shapely.to_wkb(array)) for array in arrays],
+            }
+            write_versioned_pickle(self._cache_path(layer), PYRAMID_CACHE_MAGIC, PYRAMID_CACHE_VERSION, payload)
+        except Exception as e:
+            print(f"Error writing geometry pyramid for '{layer}': {e}")
+        finally:
+            with self._lock:
+                self._building.discard(layer)
+
+_geometry_pyramid: Optional[GeometryPyramid] = None
+
+def get_geometry_pyramid() -> GeometryPyramid:
+    """获取与共享 GeoDataStore 对应的几何金字塔"""
+    global _geometry_pyramid
+    if _geometry_pyramid is None:
+        _geometry_pyramid = GeometryPyramid(get_geo_data_store(), get_region_index())
+    return _geometry_pyramid
+
+# --- 空间查询 ---
+SPATIAL_QUERY_LAYERS = ("district", "city", "province")  # 点选时由深到浅依次查找
+
+class RegionSpatialIndex:
+    """按图层建立的 STRtree 空间索引，把地图坐标解析为包含该点的最深一级区域。
+
+    每个图层的树和预处理几何在首次查询时建立一次，之后所有查询共用。
+    界面线程应先用 is_ready 判断，避免在界面线程中加载图层和建树（由 DataLoadTask 调用 warm_up 在后台建立）。
+    """
+    def __init__(self, store: GeoDataStore, region_index: RegionIndex,
+                 layers: Tuple[str, ...] = SPATIAL_QUERY_LAYERS):
+        self.store = store
+        self.region_index = region_index
+        self.layers = layers
+        # 图层 -> (STRtree, 几何数组, 各行adcode, 各行名称)；图层不可用时为 None
+        self._trees: Dict[str, Optional[Tuple[shapely.STRtree, Any, List[Any], List[str]]]] = {}
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        """全部图层的索引是否已建立（不会触发建立）"""
+        return all(layer in self._trees for layer in self.layers)
+
+    def _tree(self, layer: str) -> Optional[Tuple[shapely.STRtree, Any, List[Any], List[str]]]:
+        with self._lock:
+            if layer not in self._trees:
+                gdf = self.store.get(layer)
+                if gdf is None or gdf.empty:
+                    self._trees[layer] = None
+                    return None
+                start = time.perf_counter()
+                geometries = gdf.geometry.to_numpy()
+                # 预处理几何，之后的点包含判断无需重复建立内部索引
+                shapely.prepare(geometries)
+                self._trees[layer] = (shapely.STRtree(geometries), geometries,
+                                      gdf[ADCODE_COLUMNS[layer]].tolist(),
+                                      gdf[NAME_COLUMNS[layer]].astype(str).tolist())
+                print(f"Built spatial index for '{layer}' in {time.perf_counter() - start:.3f}s")
+        return self._trees[layer]
+
+    def warm_up(self):
+        """提前建立全部图层的空间索引"""
+        for layer in self.layers:
+            self._tree(layer)
+
+    def query_rows(self, layer: str, x: float, y: float) -> List[int]:
+        """图层中包含点 (x, y) 的行位置：先按外包框查候选，再做精确判断"""
+        entry = self._tree(layer)
+        if entry is None:
+            return []
+        tree, geometries = entry[0], entry[1]
+        candidates = tree.query(shapely.Point(x, y))
+        if len(candidates) == 0:
+            return []
+        candidates.sort()
+        return candidates[shapely.contains_xy(geometries[candidates], x, y)].tolist()
+
+    def feature_at(self, layer: str, x: float, y: float) -> Optional[Tuple[str, Any]]:
+        """图层中包含点 (x, y) 的要素 (名称, adcode)，不要求已链接到文本数据"""
+        rows = self.query_rows(layer, x, y)
+        if not rows:
+            return None
+        _, _, adcodes, names = self._trees[layer]
+        return names[rows[0]], adcodes[rows[0]]
+
+    def region_at(self, x: float, y: float) -> Optional[Region]:
+        """包含点 (x, y) 的最深一级已链接区域，没有时为 None"""
+        for layer in self.layers:
+            entry = self._tree(layer)
+            if entry is None:
+                continue
+            adcodes = entry[2]
+            level = LAYER_LEVELS[layer]
+            for row in self.query_rows(layer, x, y):
+                # 不同级别可能共用 adcode（如省直辖县级市），按命中图层的级别查找
+                region = self.region_index.region(level, adcodes[row])
+                if region is not None:
+                    return region
+        return None
+
+_region_spatial_index: Optional[RegionSpatialIndex] = None
+
+def get_region_spatial_index() -> RegionSpatialIndex:
+    """获取与共享 GeoDataStore 对应的空间索引"""
+    global _region_spatial_index
+    if _region_spatial_index is None:
+        _region_spatial_index = RegionSpatialIndex(get_geo_data_store(), get_region_index())
+    return _region_spatial_index
+
+# --- Color Configuration for Maps ---
+LEVEL_COLORS = {
+    0: 'lightgrey',  # 国家
+    1: '#FF7F7F',    # 省
+    2: '#FFFFBF',    # 市
+    3: '#7FBFFF',    # 县
+    'default': 'lightgrey',
+    'edge': 'black'
+}
+
+# --- 地图绘制 ---
+MINI_MAP_CACHE_SIZE = 64  # 小地图背景最多缓存多少个上级区域
+
+def geometries_to_paths(geometries) -> np.ndarray:
+    """把一组（多）多边形一次性转换为复合路径（内环作为洞），返回与输入对齐的对象数组，空几何为 None。
+
+    全部环的坐标一次取出，按各环的坐标数切分；路径直接引用这块坐标数组，不再逐个复制。
+    """
+    geometries = np.asarray(geometries, dtype=object)
+    paths = np.full(len(geometries), None, dtype=object)
+    parts, part_owners = shapely.get_parts(geometries, return_index=True)
+    rings, ring_parts = shapely.get_rings(parts, return_index=True)
+    ring_sizes = shapely.get_num_coordinates(rings)
+    rings, ring_parts, ring_sizes = rings[ring_sizes > 0], ring_parts[ring_sizes > 0], ring_sizes[ring_sizes > 0]
+    if len(rings) == 0:
+        return paths
+    coords = shapely.get_coordinates(rings)
+    ring_ends = np.cumsum(ring_sizes)
+    ring_starts = ring_ends - ring_sizes
+    codes = np.full(len(coords), Path.LINETO, dtype=Path.code_type)
+    codes[ring_starts] = Path.MOVETO
+    codes[ring_ends - 1] = Path.CLOSEPOLY
+    # 同一几何的环在结果中是连续的，首尾两个环即确定该几何的坐标区间
+    owners, first_rings, ring_counts = np.unique(part_owners[ring_parts], return_index=True, return_counts=True)
+    for owner, first, count in zip(owners.tolist(), first_rings.tolist(), ring_counts.tolist()):
+        start, stop = ring_starts[first], ring_ends[first + count - 1]
+        paths[owner] = Path(coords[start:stop], codes[start:stop])
+    return paths
+
+def geometry_to_path(geometry) -> Optional[Path]:
+    """把单个（多）多边形转换为一条复合路径"""
+    if geometry is None or geometry.is_empty:
+        return None
+    geometries = np.empty(1, dtype=object)
+    geometries[0] = geometry
+    return geometries_to_paths(geometries)[0]
+
+class MiniMapBackground:
+    """小地图背景：某个上级区域内全部下级区域的绘图路径及显示范围"""
+    __slots__ = ("signature", "bounds", "paths", "child_paths")
+
+    def __init__(self, signature: Tuple, bounds, paths: List[Path], child_paths: Dict[Any, Path]):
+        self.signature = signature
+        self.bounds = bounds
+        self.paths = paths
+        self.child_paths = child_paths
+
+class MapRenderer:
+    """主地图和小地图的绘制（只依赖 matplotlib Figure，不依赖Qt）。
+
+    界面中的 MapViewer 用它绘制并在其上做局部重绘；命令行导出直接配合 Agg 画布使用。
+    animated 为 True 时主地图区域和小地图高亮创建为动画artist，由调用方单独绘制。
+    """
+    def __init__(self, figure: Optional[Figure] = None, animated: bool = False):
+        self.figure = figure if figure is not None else Figure(figsize=(8, 6))
+        self.animated = animated
+
+        # 创建主地图axes (占据大部分空间)
+        self.ax_main = self.figure.add_subplot(111)
+        # 创建小地图axes (左上角)
+        self.ax_mini = self.figure.add_axes([0.02, 0.7, 0.25, 0.25])
+
+        self._setup_axes_style(self.ax_main)
+        self._setup_axes_style(self.ax_mini)
+
+        # 存储当前显示的数据，用于小地图
+        self.current_region = None
+        self.all_shapefiles = None
+        self.geometry_pyramid: Optional[GeometryPyramid] = None
+        self.region_index: Optional[RegionIndex] = None
+        # 小地图背景按 (图层, 上级adcode) 缓存，最近使用的放在末尾
+        self._mini_backgrounds: OrderedDict = OrderedDict()
+        # 整个图层的绘图路径按 (图层, 简化级别) 缓存：(来源 GeoDataFrame, 与其行位置对齐的路径数组)
+        self._layer_path_cache: Dict[Tuple[str, int], Tuple[gpd.GeoDataFrame, np.ndarray]] = {}
+
+        # 当前画面中的主地图区域、小地图高亮及小地图背景
+        self.main_artist: Optional[PathCollection] = None
+        self.mini_highlight: Optional[PathCollection] = None
+        self.scene_background: Optional[MiniMapBackground] = None
+
+    def _setup_axes_style(self, ax):
+        """设置axes的基本样式"""
+        ax.set_xticks([])
+        ax.set_yticks([])
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+    def set_shapefiles_reference(self, shapefiles_dict: ShapefileData):
+        """设置shapefile数据引用，用于小地图显示"""
+        self.all_shapefiles = shapefiles_dict
+        self._mini_backgrounds.clear()
+        self._layer_path_cache.clear()
+
+    def set_geometry_pyramid(self, pyramid: Optional[GeometryPyramid]):
+        """设置多分辨率几何，绘图时按显示比例选用简化几何"""
+        self.geometry_pyramid = pyramid
+        self._mini_backgrounds.clear()
+        self._layer_path_cache.clear()
+
+    def set_region_index(self, region_index: Optional[RegionIndex]):
+        """设置区划查找表，小地图按上级adcode直接取下级行区间"""
+        self.region_index = region_index
+        self._mini_backgrounds.clear()
+
+    def reset_axes(self):
+        """清空两个axes及当前画面的artist"""
+        self.ax_main.clear()
+        self.ax_mini.clear()
+        self._setup_axes_style(self.ax_main)
+        self._setup_axes_style(self.ax_mini)
+        self.main_artist = None
+        self.mini_highlight = None
+        self.scene_background = None
+
+    def draw_scene(self, main_path: Optional[Path], geometry_to_plot, fill_color: str, edge_color: str,
+                   fit_bounds: bool, mini_scene: Optional[Tuple]):
+        """在清空后的axes上绘制主地图和小地图"""
+        # 显示主地图
+        if main_path is not None:
+            self.main_artist = PathCollection([main_path], animated=self.animated)
+            self.ax_main.add_collection(self.main_artist, autolim=False)
+            self.update_main_artist(main_path, geometry_to_plot, fill_color, edge_color, fit_bounds)
+        else:
+            self._plot_main_map(geometry_to_plot, fill_color, edge_color, fit_bounds)
+
+        # 显示小地图
+        if mini_scene is not None:
+            self._draw_mini_background(*mini_scene)
+
+    def render_region(self, region_data: AdministrativeRegion, fill_color: Optional[str] = None,
+                      edge_color: str = LEVEL_COLORS['edge']):
+        """按界面中选中区域时的布局绘制区域（不做局部重绘）"""
+        self.current_region = region_data
+        geometry = region_data.get('geometry')
+        if fill_color is None:
+            fill_color = LEVEL_COLORS.get(region_data.get('level', 0), LEVEL_COLORS['default'])
+        self.reset_axes()
+        self.draw_scene(self.region_path(geometry, region_data), geometry, fill_color, edge_color,
+                        True, self.mini_scene())
+
+    def draw_default_view(self, china_gdf: Optional[gpd.GeoDataFrame]):
+        """绘制默认视图：主地图和小地图都显示中国轮廓"""
+        self.current_region = None
+        try:
+            # 始终使用简单的matplotlib绘图，不再依赖Cartopy
+            if china_gdf is not None and not china_gdf.empty:
+                self._draw_layer(self.ax_main, "country", china_gdf, facecolors=LEVEL_COLORS[0])
+            else:
+                self.ax_main.text(0.5, 0.5, "中国地图数据缺失", ha='center', va='center')
+            
+        except Exception as e:
+            print(f"Error creating China map: {e}")
+            if china_gdf is not None and not china_gdf.empty:
+                self.ax_main.add_collection(PathCollection(
+                    [path for path in geometries_to_paths(china_gdf.geometry) if path is not None],
+                    facecolors=LEVEL_COLORS[0], edgecolors=LEVEL_COLORS['edge']), autolim=False)
+                self._fit_bounds(self.ax_main, china_gdf)
+            else:
+                 self.ax_main.text(0.5, 0.5, "中国地图数据不可用", ha='center', va='center')
+        
+        # 小地图在默认视图下也显示中国轮廓
+        if china_gdf is not None and not china_gdf.empty:
+            self._draw_layer(self.ax_mini, "country", china_gdf, facecolors=LEVEL_COLORS[0], alpha=0.5)
+
+    def _units_per_pixel(self, ax, bounds) -> float:
+        """按 _fit_bounds 的留白估算每个像素对应的地图单位"""
+        bbox = ax.get_window_extent()
+        minx, miny, maxx, maxy = bounds
+        if bbox.width <= 0 or bbox.height <= 0 or pd.isna(minx):
+            return 0.0
+        return max((maxx - minx) * 1.2 / bbox.width, (maxy - miny) * 1.2 / bbox.height)
+
+    def _pyramid_level(self, ax, gdf) -> int:
+        """按 gdf 在该axes上的显示比例选择金字塔级别"""
+        if self.geometry_pyramid is None or gdf.empty:
+            return 0
+        return self.geometry_pyramid.select_level(self._units_per_pixel(ax, gdf.total_bounds))
+
+    def _mini_level(self, gdf) -> int:
+        return self._pyramid_level(self.ax_mini, gdf)
+
+    def _layer_rows(self, layer: str, gdf: gpd.GeoDataFrame, level: int):
+        """取 gdf 中各行在指定级别下的几何"""
+        if self.geometry_pyramid is None or level <= 0 or gdf.empty:
+            return gdf
+        series = self.geometry_pyramid.layer(layer, level)
+        return gdf if series is None else series.loc[gdf.index]
+
+    def _layer_paths(self, layer: str, gdf: gpd.GeoDataFrame, level: int) -> np.ndarray:
+        """整个图层 gdf 在指定级别下各行的路径（按行位置对齐），每个 (图层, 级别) 只转换一次"""
+        if self.geometry_pyramid is not None and level > 0:
+            self.geometry_pyramid.layer(layer, level)  # 尚未就绪时触发读取或生成
+            if not self.geometry_pyramid.is_ready(layer):
+                level = 0
+        else:
+            level = 0
+        key = (layer, level)
+        cached = self._layer_path_cache.get(key)
+        if cached is not None and cached[0] is gdf:
+            return cached[1]
+        geometries = gdf.geometry if level == 0 else self._layer_rows(layer, gdf, level)
+        paths = geometries_to_paths(geometries)
+        self._layer_path_cache[key] = (gdf, paths)
+        return paths
+
+    def _draw_layer(self, ax, layer: str, gdf: gpd.GeoDataFrame, **kwargs):
+        """用缓存的图层路径把整个 gdf 画成一个集合，并调整显示范围"""
+        paths = self._layer_paths(layer, gdf, self._pyramid_level(ax, gdf))
+        ax.add_collection(PathCollection([path for path in paths if path is not None],
+                                         edgecolors=LEVEL_COLORS['edge'], **kwargs),
+                          autolim=False)
+        self._fit_bounds(ax, gdf)
+
+    def region_path(self, geometry, region_data) -> Optional[Path]:
+        """区域在主地图显示比例下的路径：优先取缓存的图层路径，找不到对应行时才单独转换；
+        GeoDataFrame/GeoSeries 等返回 None，由 _plot_main_map 绘制"""
+        if not self._can_plot_geometry(geometry) or isinstance(geometry, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            return None
+        layer = LEVEL_LAYERS.get(region_data.get("level")) if region_data else None
+        if (layer is not None and region_data.get("adcode") is not None and self.region_index is not None
+                and self.all_shapefiles and layer in self.all_shapefiles):
+            row = self.region_index.row(layer, region_data.get("adcode"))
+            if row is not None:
+                level = 0
+                if self.geometry_pyramid is not None:
+                    level = self.geometry_pyramid.select_level(self._units_per_pixel(self.ax_main, geometry.bounds))
+                path = self._layer_paths(layer, self.all_shapefiles[layer], level)[row]
+                if path is not None:
+                    return path
+        try:
+            return geometry_to_path(geometry)
+        except Exception as e:
+            print(f"Error converting main geometry: {e}")
+            return None
+
+    def update_main_artist(self, path: Path, geometry, fill_color, edge_color, fit_bounds):
+        self.main_artist.set_paths([path])
+        self.main_artist.set_facecolor(fill_color)
+        self.main_artist.set_edgecolor(edge_color)
+        if fit_bounds:
+            self._set_view_bounds(self.ax_main, geometry.bounds)
+
+    def update_mini_highlight(self, mini_scene):
+        if self.mini_highlight is None or mini_scene is None:
+            return
+        background, _, _, highlight_adcode, highlight_color = mini_scene
+        highlight = background.child_paths.get(highlight_adcode) if highlight_adcode else None
+        self.mini_highlight.set_visible(highlight is not None)
+        if highlight is not None:
+            self.mini_highlight.set_paths([highlight])
+            self.mini_highlight.set_facecolor(highlight_color)
+
+    def _plot_main_map(self, geometry_to_plot, fill_color, edge_color, fit_bounds):
+        """绘制主地图"""
+        can_plot = self._can_plot_geometry(geometry_to_plot)
+        
+        if can_plot:
+            try:
+                if isinstance(geometry_to_plot, (gpd.GeoDataFrame, gpd.GeoSeries)):
+                    plotted_geom = geometry_to_plot
+                else:
+                    plotted_geom = gpd.GeoSeries([geometry_to_plot])
+
+                paths = [path for path in geometries_to_paths(plotted_geom.geometry) if path is not None]
+                self.ax_main.add_collection(PathCollection(paths, facecolors=fill_color, edgecolors=edge_color),
+                                            autolim=False)
+
+                if fit_bounds:
+                    self._fit_bounds(self.ax_main, plotted_geom)
+
+                self.ax_main.set_aspect('equal', adjustable='box')
+            except Exception as e:
+                print(f"Error plotting main geometry: {e}")
+                self.ax_main.text(0.5, 0.5, "无法绘制地图数据", ha='center', va='center')
+        else:
+            self.ax_main.text(0.5, 0.5, "无有效地理数据可显示", ha='center', va='center')
+
+    def mini_scene(self) -> Optional[Tuple]:
+        """小地图内容 - 上级区域背景和当前区域位置：(背景, 填充色, 透明度, 高亮adcode, 高亮色)"""
+        if not self.current_region or not self.all_shapefiles:
+            return None
+            
+        current_level = self.current_region.get("level")
+        
+        try:
+            if current_level == 1:  # 省级 - 小地图显示全国
+                return self._show_country_with_province()
+            elif current_level == 2:  # 市级 - 小地图显示省内
+                return self._show_province_with_city()
+            elif current_level == 3:  # 区县级 - 小地图显示市内
+                return self._show_city_with_district()
+            else: # 如果没有匹配的层级，小地图可能不显示，或者显示一个空白的中国地图
+                background = self._mini_background("country")
+                if background is not None:
+                    return (background, LEVEL_COLORS[0], 0.5, None, None)
+        except Exception as e:
+            print(f"Error plotting mini map: {e}")
+        return None
+
+    def _show_country_with_province(self):
+        """小地图：显示全国边界及当前省份位置"""
+        if "country" not in self.all_shapefiles or "province" not in self.all_shapefiles:
+            return None
+        background = self._mini_background("country", child_layer="province")
+        if background is not None:
+            return (background, LEVEL_COLORS['default'], 0.7, self.current_region.get("adcode"), LEVEL_COLORS[1])
+        return None
+
+    def _show_province_with_city(self):
+        """小地图：显示省边界及当前市位置"""
+        if "city" not in self.all_shapefiles:
+            return None
+        parent_adcode = self.current_region.get("parent_adcode")
+        if parent_adcode:
+            background = self._mini_background("city", parent_adcode)
+            if background is not None:
+                return (background, LEVEL_COLORS['default'], 0.7, self.current_region.get("adcode"), LEVEL_COLORS[2])
+        return None
+
+    def _show_city_with_district(self):
+        """小地图：显示市边界及当前区县位置"""
+        if "district" not in self.all_shapefiles:
+            return None
+        parent_adcode = self.current_region.get("parent_adcode")
+        if parent_adcode:
+            background = self._mini_background("district", parent_adcode)
+            if background is not None:
+                return (background, LEVEL_COLORS['default'], 0.7, self.current_region.get("adcode"), LEVEL_COLORS[3])
+        return None
+
+    def _mini_signature(self, layers: Tuple[str, ...], bounds) -> Tuple:
+        """背景依赖的简化级别及金字塔是否就绪；变化时需要重建背景"""
+        if self.geometry_pyramid is None:
+            return (0,)
+        level = self.geometry_pyramid.select_level(self._units_per_pixel(self.ax_mini, bounds))
+        return (level,) + tuple(self.geometry_pyramid.is_ready(layer) for layer in layers)
+
+    def _mini_background(self, layer: str, parent_adcode: Optional[Any] = None,
+                         child_layer: Optional[str] = None) -> Optional[MiniMapBackground]:
+        """取（必要时生成）上级区域的小地图背景，child_layer 为可高亮的下级图层，默认与背景相同"""
+        child_layer = child_layer or layer
+        key = (layer, parent_adcode)
+        background = self._mini_backgrounds.get(key)
+        if background is not None:
+            self._mini_backgrounds.move_to_end(key)
+            if background.signature == self._mini_signature((layer, child_layer), background.bounds):
+                return background
+
+        gdf = self.all_shapefiles[layer]
+        if parent_adcode is None:
+            positions = slice(None)
+        elif self.region_index is not None:
+            positions = self.region_index.children_slice(layer, parent_adcode)
+        else:
+            positions = np.flatnonzero((gdf[LAYER_PARENT_COLUMNS[layer]] == parent_adcode).to_numpy())
+        rows = gdf.iloc[positions]
+        if rows.empty:
+            return None
+        bounds = rows.total_bounds
+        signature = self._mini_signature((layer, child_layer), bounds)
+        level = signature[0]
+
+        row_paths = self._layer_paths(layer, gdf, level)[positions]
+        paths = [path for path in row_paths if path is not None]
+        if child_layer == layer:
+            child_rows, child_row_paths = rows, row_paths
+        else:
+            child_rows = self.all_shapefiles[child_layer]
+            child_row_paths = self._layer_paths(child_layer, child_rows, level)
+        child_paths: Dict[Any, Path] = {}
+        for adcode, path in zip(child_rows[ADCODE_COLUMNS[child_layer]], child_row_paths):
+            if path is not None and adcode not in child_paths:
+                child_paths[adcode] = path
+
+        background = MiniMapBackground(signature, bounds, paths, child_paths)
+        self._mini_backgrounds[key] = background
+        self._mini_backgrounds.move_to_end(key)
+        while len(self._mini_backgrounds) > MINI_MAP_CACHE_SIZE:
+            self._mini_backgrounds.popitem(last=False)
+        return background
+
+    def _draw_mini_background(self, background: MiniMapBackground, facecolor: str, alpha: float,
+                              highlight_adcode: Optional[Any] = None, highlight_color: Optional[str] = None):
+        """用缓存的路径绘制小地图背景，高亮的下级区域作为单独的artist绘制在其上"""
+        self.ax_mini.add_collection(PathCollection(background.paths, facecolors=facecolor,
+                                                   edgecolors=LEVEL_COLORS['edge'], alpha=alpha),
+                                    autolim=False)
+        self.mini_highlight = PathCollection([], edgecolors=LEVEL_COLORS['edge'], animated=self.animated)
+        self.ax_mini.add_collection(self.mini_highlight, autolim=False)
+        self.update_mini_highlight((background, facecolor, alpha, highlight_adcode, highlight_color))
+        self.scene_background = background
+        self._set_view_bounds(self.ax_mini, background.bounds)
+
+    def _can_plot_geometry(self, geometry):
+        """检查几何数据是否可以绘制"""
+        if geometry is not None:
+            if hasattr(geometry, 'empty'): 
+                return not geometry.empty
+            elif hasattr(geometry, 'is_empty'): 
+                return not geometry.is_empty
+            else: 
+                return True
+        return False
+
+    def _fit_bounds(self, ax, gdf):
+        """调整axes的显示范围"""
+        self._set_view_bounds(ax, gdf.total_bounds)
+
+    def _set_view_bounds(self, ax, bounds):
+        """按给定范围（留出10%边距）设置axes的显示范围"""
+        try:
+            minx, miny, maxx, maxy = bounds
+            # 防止无效边界，例如单点几何体或空几何体
+            if not (pd.isna(minx) or pd.isna(miny) or pd.isna(maxx) or pd.isna(maxy)):
+                padding_x = (maxx - minx) * 0.1 if (maxx - minx) > 0 else 0.1
+                padding_y = (maxy - miny) * 0.1 if (maxy - miny) > 0 else 0.1
+                
+                # 针对边界为零的情况增加一个小的固定缓冲
+                if padding_x == 0: padding_x = 0.1
+                if padding_y == 0: padding_y = 0.1
+
+                ax.set_xlim(minx - padding_x, maxx + padding_x)
+                ax.set_ylim(miny - padding_y, maxy + padding_y)
+                ax.set_aspect('equal', adjustable='box')
+            # else: # 移除调试打印
+                # print(f"Fit bounds for ax {ax}: Invalid bounds (contains NaN). Cannot fit.") # 移除调试打印
+        except Exception as e:
+            print(f"Error fitting bounds for ax {ax}: {e}")
@@ -0,0 +1,233 @@
+"""
+批量导出地图：按界面中选中区域时的主地图 + 小地图布局，把全部已链接的省/市/区县渲染为 PNG 或 SVG。
+
+不导入 Qt（绘制代码来自 core.py），使用 matplotlib 的 Agg 画布，在进程池中并行渲染；
+输出目录中的 manifest.json 记录每张图的指纹，区域及其小地图内容未变化时跳过。
+
+用法: python main.py export-maps OUTPUT_DIR [--format png|svg] [--levels 1 2 3] [--workers N] [--dpi N] [--force]
+      python export_maps.py OUTPUT_DIR [...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import shapely
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from core import (
+    LEVEL_COLORS, LEVEL_LAYERS, PYRAMID_TOLERANCES, SHAPEFILE_PATHS, MapRenderer, Region,
+    get_geo_data_store, get_geometry_pyramid, get_region_index, iter_regions, main_data_processing,
+)
+
+EXPORT_FORMATS = ("png", "svg")
+EXPORT_VERSION = 1               # 绘图方式变化时递增，使之前导出的图全部重新生成
+EXPORT_FIGSIZE = (8, 6)          # 与界面中地图控件的 Figure 相同
+EXPORT_MANIFEST_NAME = "manifest.json"
+EXPORT_CHUNK_SIZE = 16           # 每次交给子进程的区域数
+
+# 子进程中的渲染器及区域列表（由 _init_worker 建立）
+_worker_renderer: Optional[MapRenderer] = None
+_worker_regions: List[Region] = []
+_worker_format = "png"
+
+
+def _load_export_data() -> List[Region]:
+    """读取（缓存的）数据和简化几何，返回按先序排列的全部区域；主进程和子进程得到相同的顺序"""
+    data = main_data_processing()
+    if not data:
+        return []
+    pyramid = get_geometry_pyramid()
+    for layer in SHAPEFILE_PATHS:
+        # 等待简化几何就绪，保证各进程使用相同级别的几何
+        if not pyramid.wait_ready(layer):
+            print(f"Geometry pyramid for '{layer}' is unavailable; exporting with original geometry")
+    return list(iter_regions(data))
+
+
+def _init_worker(fmt: str, dpi: int):
+    global _worker_renderer, _worker_regions, _worker_format
+    _worker_regions = _load_export_data()
+    renderer = MapRenderer(Figure(figsize=EXPORT_FIGSIZE, dpi=dpi))
+    FigureCanvasAgg(renderer.figure)
+    renderer.set_shapefiles_reference(get_geo_data_store())
+    renderer.set_region_index(get_region_index())
+    renderer.set_geometry_pyramid(get_geometry_pyramid())
+    _worker_renderer = renderer
+    _worker_format = fmt
+
+
+def _render_chunk(tasks: List[Tuple[int, str]]) -> List[Tuple[int, Optional[str]]]:
+    """在子进程中渲染一批 (区域序号, 输出路径)，返回 (区域序号, 错误信息或 None)"""
+    results = []
+    for position, path in tasks:
+        try:
+            _worker_renderer.render_region(_worker_regions[position])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + ".tmp"
+            _worker_renderer.figure.savefig(tmp_path, format=_worker_format)
+            os.replace(tmp_path, path)
+            results.append((position, None))
+        except Exception as e:
+            results.append((position, str(e)))
+    return results
+
+
+def _digest(*parts) -> str:
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+class RegionFingerprints:
+    """区域图片的指纹：导出设置、区域自身几何，以及小地图中显示的同级区域几何"""
+    def __init__(self, options: Dict):
+        self.store = get_geo_data_store()
+        self.region_index = get_region_index()
+        self.options_key = json.dumps(options, sort_keys=True)
+        self._row_digests: Dict[str, List[str]] = {}
+        self._context_digests: Dict[Tuple[str, object], str] = {}
+
+    def _rows(self, layer: str) -> List[str]:
+        if layer not in self._row_digests:
+            wkbs = shapely.to_wkb(self.store[layer].geometry.to_numpy())
+            self._row_digests[layer] = [hashlib.sha1(wkb or b"").hexdigest() for wkb in wkbs]
+        return self._row_digests[layer]
+
+    def _context(self, region: Region, layer: str) -> str:
+        """小地图内容的摘要：省级为全国及全部省份，市和区县为同一上级下的全部同级区域"""
+        parent_adcode = region.parent_adcode if region.level > 1 else None
+        key = (layer, parent_adcode)
+        if key not in self._context_digests:
+            if parent_adcode is None:
+                digests = self._rows("country") + self._rows(layer)
+            else:
+                digests = self._rows(layer)[self.region_index.children_slice(layer, parent_adcode)]
+            self._context_digests[key] = _digest(*digests)
+        return self._context_digests[key]
+
+    def region(self, region: Region) -> str:
+        layer = LEVEL_LAYERS[region.level]
+        row = self.region_index.row(layer, region.adcode)
+        if row is not None:
+            own = self._rows(layer)[row]
+        else:
+            own = hashlib.sha1(shapely.to_wkb(region.geometry)).hexdigest()
+        return _digest(self.options_key, region.level, region.adcode, region.parent_adcode,
+                       own, self._context(region, layer))
+
+
+def load_manifest(path: str) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("entries", {})
+    except Exception as e:
+        print(f"Error reading export manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(path: str, entries: Dict[str, str]):
+    """先写临时文件再替换，避免中断时留下半个清单"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": EXPORT_VERSION, "entries": entries}, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def export_maps(output_dir: str, fmt: str = "png", levels=(1, 2, 3), workers: Optional[int] = None,
+                dpi: int = 100, force: bool = False) -> bool:
+    """渲染全部已链接区域；返回是否全部成功"""
+    start = time.perf_counter()
+    regions = _load_export_data()
+    if not regions:
+        print("No data to export.")
+        return False
+
+    options = {"version": EXPORT_VERSION, "format": fmt, "dpi": dpi, "figsize": EXPORT_FIGSIZE,
+               "tolerances": PYRAMID_TOLERANCES, "colors": {str(key): value for key, value in LEVEL_COLORS.items()}}
+    fingerprints = RegionFingerprints(options)
+    manifest_path = os.path.join(output_dir, EXPORT_MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+
+    # 本次不导出的级别保留原有清单记录
+    exported_layers = {LEVEL_LAYERS[level] for level in levels}
+    entries = {relative_path: fingerprint for relative_path, fingerprint in previous.items()
+               if relative_path.split("/", 1)[0] not in exported_layers}
+    pending: Dict[int, Tuple[str, str]] = {}  # 区域序号 -> (清单中的相对路径, 指纹)
+    seen = set()
+    duplicates = 0
+    for position, region in enumerate(regions):
+        if region.level not in levels or region.adcode is None or region.geometry is None:
+            continue
+        relative_path = f"{LEVEL_LAYERS[region.level]}/{region.adcode}.{fmt}"
+        if relative_path in seen:
+            duplicates += 1  # 同级同 adcode 的区域只导出第一个
+            continue
+        seen.add(relative_path)
+        fingerprint = fingerprints.region(region)
+        if (not force and previous.get(relative_path) == fingerprint
+                and os.path.exists(os.path.join(output_dir, relative_path))):
+            entries[relative_path] = fingerprint
+        else:
+            pending[position] = (relative_path, fingerprint)
+    skipped = len(seen) - len(pending)
+    print(f"Prepared {len(seen)} regions in {time.perf_counter() - start:.1f}s: "
+          f"{len(pending)} to render, {skipped} unchanged")
+
+    failed = 0
+    workers = workers or os.cpu_count() or 1
+    render_start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    if pending:
+        tasks = [(position, os.path.join(output_dir, relative_path))
+                 for position, (relative_path, _) in pending.items()]
+        chunks = [tasks[i:i + EXPORT_CHUNK_SIZE] for i in range(0, len(tasks), EXPORT_CHUNK_SIZE)]
+        done = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fmt, dpi)) as executor:
+            futures = [executor.submit(_render_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                for position, error in future.result():
+                    relative_path, fingerprint = pending[position]
+                    if error is None:
+                        entries[relative_path] = fingerprint
+                    else:
+                        failed += 1
+                        print(f"Error rendering {relative_path}: {error}")
+                done += 1
+                if done % 20 == 0 or done == len(futures):
+                    print(f"Rendered {done}/{len(futures)} batches")
+    if entries != previous:
+        save_manifest(manifest_path, entries)
+
+    elapsed = time.perf_counter() - render_start
+    rendered = len(pending) - failed
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    print(f"Rendered {rendered} regions in {elapsed:.1f}s ({rate:.1f} regions/s, {workers} workers); "
+          f"skipped {skipped} unchanged, {failed} failed, {duplicates} duplicate adcodes")
+    return failed == 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="export-maps", description="Render every linked region's map to PNG/SVG.")
+    parser.add_argument("output_dir", help="directory to write <layer>/<adcode>.<format> files and the manifest to")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="png", help="image format (default: png)")
+    parser.add_argument("--levels", type=int, nargs="+", choices=(1, 2, 3), default=[1, 2, 3],
+                        help="administrative levels to export: 1 province, 2 city, 3 district")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--dpi", type=int, default=100, help="output resolution; the figure is 8x6 inches")
+    parser.add_argument("--force", action="store_true", help="re-render regions even if they are unchanged")
+    args = parser.parse_args(argv)
+    ok = export_maps(args.output_dir, args.format, tuple(args.levels), args.workers, args.dpi, args.force)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
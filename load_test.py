@@ -0,0 +1,174 @@
+"""
+本地 HTTP 接口（api_server.py）的压力测试：多个保持长连接的客户端循环请求一组接口，报告每秒请求数和延迟分布。
+
+请求集合从 /regions 和各省的 /children 中取得，包括区域详情、下级列表、地名搜索、全文检索和简化几何。
+先启动服务（python main.py serve），再运行本脚本。
+
+用法: python load_test.py [--host 127.0.0.1] [--port 8765] [--connections 16] [--duration 10] [--gzip] [--revalidate]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from api_server import API_HOST, API_PORT
+
+LOAD_TEST_SEED = 2024           # 固定随机种子，各次测试的请求顺序相同
+LOAD_TEST_CITY_SAMPLE = 40      # 取多少个市级区域的下级列表作为请求
+LOAD_TEST_GEOMETRY_DETAIL = 2   # 几何请求使用的简化级别
+
+
+class HttpConnection:
+    """最简单的 HTTP/1.1 长连接客户端，只支持带 Content-Length 的响应"""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, target: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f"GET {target} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ")[1])
+        response_headers = {}
+        for line in head[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                response_headers[name.strip().lower()] = value.strip()
+        body = await self.reader.readexactly(int(response_headers.get("content-length", "0")))
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, body
+
+    async def get_json(self, target: str):
+        status, _, body = await self.request(target, {})
+        if status != 200:
+            raise RuntimeError(f"GET {target} returned HTTP {status}")
+        return json.loads(body)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+async def collect_targets(host: str, port: int) -> List[str]:
+    """从接口本身取得一组有代表性的请求路径"""
+    connection = HttpConnection(host, port)
+    try:
+        provinces = (await connection.get_json("/regions"))["regions"]
+        cities = []
+        for province in provinces:
+            if province["adcode"] is not None:
+                cities += (await connection.get_json(f"/regions/{province['adcode']}/children"))["children"]
+    finally:
+        await connection.close()
+
+    rng = random.Random(LOAD_TEST_SEED)
+    linked_cities = [city for city in cities if city["adcode"] is not None]
+    sample = rng.sample(linked_cities, min(LOAD_TEST_CITY_SAMPLE, len(linked_cities)))
+    targets = ["/regions"]
+    for region in provinces + sample:
+        if region["adcode"] is None:
+            continue
+        level = region["level"]
+        targets.append(f"/regions/{region['adcode']}?level={level}")
+        targets.append(f"/regions/{region['adcode']}/children?level={level}")
+        targets.append(f"/regions/{region['adcode']}/geometry?level={level}&detail={LOAD_TEST_GEOMETRY_DETAIL}")
+    for region in sample:
+        targets.append(f"/search?q={quote(region['name'][:2])}")
+        targets.append(f"/fulltext?q={quote(region['name'][:2])}&limit=20")
+    rng.shuffle(targets)
+    return targets
+
+
+async def run_client(host: str, port: int, targets: List[str], deadline: float, use_gzip: bool, revalidate: bool,
+                     offset: int, latencies: List[float], statuses: Counter, totals: Dict[str, int]):
+    connection = HttpConnection(host, port)
+    etags: Dict[str, str] = {}
+    position = offset
+    try:
+        while time.perf_counter() < deadline:
+            target = targets[position % len(targets)]
+            position += 1
+            headers = {"Accept-Encoding": "gzip"} if use_gzip else {}
+            if revalidate and target in etags:
+                headers["If-None-Match"] = etags[target]
+            start = time.perf_counter()
+            try:
+                status, response_headers, body = await connection.request(target, headers)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                statuses[f"error: {type(e).__name__}"] += 1
+                await connection.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            totals["bytes"] += len(body)
+            if "etag" in response_headers:
+                etags[target] = response_headers["etag"]
+    finally:
+        await connection.close()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def load_test(host: str, port: int, connections: int, duration: float, use_gzip: bool, revalidate: bool) -> bool:
+    try:
+        targets = await collect_targets(host, port)
+    except (OSError, RuntimeError) as e:
+        print(f"Error contacting API server at {host}:{port}: {e}")
+        return False
+    print(f"Requesting {len(targets)} distinct URLs over {connections} connections for {duration:.0f}s"
+          f"{' with gzip' if use_gzip else ''}{' and If-None-Match' if revalidate else ''}")
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    totals = {"bytes": 0}
+    start = time.perf_counter()
+    deadline = start + duration
+    step = max(1, len(targets) // connections)
+    await asyncio.gather(*(run_client(host, port, targets, deadline, use_gzip, revalidate, i * step,
+                                      latencies, statuses, totals) for i in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Completed {len(latencies)} requests in {elapsed:.1f}s: {len(latencies) / elapsed:.0f} requests/s, "
+          f"{totals['bytes'] / elapsed / 1e6:.1f} MB/s")
+    print(f"Latency ms: p50 {percentile(latencies, 0.5) * 1000:.2f}, p95 {percentile(latencies, 0.95) * 1000:.2f}, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}, max {(latencies[-1] if latencies else 0) * 1000:.2f}")
+    print("Responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    return all(isinstance(status, int) and status in (200, 304) for status in statuses)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure requests per second against a running api_server.")
+    parser.add_argument("--host", default=API_HOST, help=f"server address (default: {API_HOST})")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"server port (default: {API_PORT})")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent keep-alive connections (default: 16)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default: 10)")
+    parser.add_argument("--gzip", action="store_true", help="send Accept-Encoding: gzip")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="send If-None-Match with the last ETag seen for each URL (measures 304 responses)")
+    args = parser.parse_args(argv)
+    ok = asyncio.run(load_test(args.host, args.port, args.connections, args.duration, args.gzip, args.revalidate))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,356 +1,189 @@
-import re
-import os
+import argparse
+import multiprocessing
 import sys
-import pandas as pd
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
 import geopandas as gpd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
 
 # --- PySide6 Imports ---
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTextBrowser, QTreeView, QLineEdit, QStatusBar, QMenuBar, QMessageBox,
-    QSplitter, QLabel, QDockWidget, QPushButton
+    QTextBrowser, QTreeView, QLineEdit, QStatusBar, QMessageBox,
+    QSplitter, QLabel, QDockWidget, QPushButton, QComboBox, QProgressBar, QCheckBox
 )
-from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, Signal
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QAction
+from PySide6.QtCore import (
+    Qt, QAbstractItemModel, QModelIndex, Signal, QObject, QRunnable, QThreadPool, QTimer
+)
+from PySide6.QtGui import QAction
 
 # Matplotlib imports for embedding in PySide6
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+from matplotlib.transforms import Bbox, IdentityTransform
+
+# 数据处理、索引和地图绘制都在 core.py 中，不依赖 Qt
+from core import (
+    AdministrativeRegion, FULLTEXT_INDEX_PATH, FullTextHit, FullTextIndex, GeoDataStore, GeometryPyramid,
+    LEVEL_COLORS, LEVEL_LAYERS, MIN_QUERY_LENGTH, MapRenderer, NameSearchIndex, ProcessedData, Region,
+    RegionIndex, RegionSpatialIndex, SHAPEFILE_ARCHIVES, SHAPEFILE_PATHS, ShapefileData,
+    get_geo_data_store, get_geometry_pyramid, get_region_index, get_region_spatial_index, main_data_processing
+)
 
 CARTOPY_AVAILABLE = False # 显式设置为 False，不再尝试导入 Cartopy
 
-# --- Configuration ---
-SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-MD_FILE_PATH = os.path.join(SCRIPT_DIR, "output.md")
-MAPS_BASE_DIR = os.path.join(SCRIPT_DIR, "maps")
-
-COUNTRY_SHP_PATH = os.path.join(MAPS_BASE_DIR, "1.Country", "country.shp")
-PROVINCE_SHP_PATH = os.path.join(MAPS_BASE_DIR, "2.Province", "province.shp")
-CITY_SHP_PATH = os.path.join(MAPS_BASE_DIR, "3.City", "city.shp")
-DISTRICT_SHP_PATH = os.path.join(MAPS_BASE_DIR, "4.District", "district.shp")
-
-# 核心修改：在打包后使用 sys._MEIPASS 来定位资源文件
-if getattr(sys, 'frozen', False):
-    # 被 PyInstaller 打包时使用临时目录
-    SCRIPT_DIR = sys._MEIPASS
-else:
-    # 正常运行使用当前脚本目录
-    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-
-MD_FILE_PATH = os.path.join(SCRIPT_DIR, "output.md")
-MAPS_BASE_DIR = os.path.join(SCRIPT_DIR, "maps")
-
-# --- Regex ---
-H1_MD_PATTERN = re.compile(r"^#\s+第[0-9]+章\s*(.+)$")
-H2_SPECIAL_ZERO_PATTERN = re.compile(r"^##\s+零、上位类说明$")
-H2_MD_PATTERN = re.compile(r"^##\s+(?:一|二|三|四|五|六|七|八|九|十|十一|十二|十三|十四|十五|十六|十七|十八|十九|二十|二十一|二十二|二十三|二十四|二十五|二十六|二十七|二十八|二十九|三十|三十一|三十二|三十三|三十四|三十五|三十六|三十七| ৩৮)、\s*(.+)$")
-H3_SPECIAL_ZERO_PATTERN = re.compile(r"^###\s+0\.上位类说明$")
-H3_MD_PATTERN = re.compile(r"^###\s*([1-9]|1[0-9]|2[0-5])\.\s*(.+)$")
-
-AdministrativeRegion = Dict[str, Any]
-ProcessedData = List[AdministrativeRegion]
-
-# --- 数据处理函数 ---
-def parse_markdown(md_filepath: str) -> ProcessedData:
-    processed_data: ProcessedData = []
-    
-    current_province: Optional[AdministrativeRegion] = None
-    current_city: Optional[AdministrativeRegion] = None
-    current_district: Optional[AdministrativeRegion] = None
-
-    active_entity: Optional[AdministrativeRegion] = None
-    active_field: str = "text_detail" 
-
-    current_text_buffer: List[str] = []
-
-    def flush_buffer():
-        nonlocal active_entity, active_field
-        if active_entity and current_text_buffer:
-            text_to_add = "\n".join(current_text_buffer).strip()
-            if text_to_add:
-                if active_field not in active_entity or active_entity[active_field] is None:
-                    active_entity[active_field] = ""
-                
-                if active_entity[active_field]:
-                    active_entity[active_field] += "\n" + text_to_add
-                else:
-                    active_entity[active_field] = text_to_add
-            current_text_buffer.clear()
-
-    try:
-        with open(md_filepath, 'r', encoding='utf-8') as f:
-            for line_content in f:
-                line = line_content.strip()
-                if not line: continue
-
-                match_h1 = H1_MD_PATTERN.match(line)
-                if match_h1:
-                    flush_buffer()
-                    province_name = match_h1.group(1).strip()
-                    current_province = {
-                        "name": province_name, "level": 1, "adcode": None, # adcode 在link_data中填充
-                        "text_general": "", "text_detail": "",
-                        "geometry": None, "children": []
-                    }
-                    processed_data.append(current_province)
-                    active_entity = current_province
-                    active_field = "text_detail"
-                    current_city = None
-                    current_district = None
-                    continue
-
-                if current_province and H2_SPECIAL_ZERO_PATTERN.match(line):
-                    flush_buffer()
-                    active_entity = current_province
-                    active_field = "text_general"
-                    continue
-
-                match_h2 = H2_MD_PATTERN.match(line)
-                if current_province and match_h2:
-                    flush_buffer()
-                    city_name = match_h2.group(1).strip()
-                    current_city = {
-                        "name": city_name, "level": 2, 
-                        "parent_name": current_province["name"],
-                        "parent_adcode": None, # 这里改为 None，在link_data中填充
-                        "adcode": None, "text_general": "", "text_detail": "",
-                        "geometry": None, "children": []
-                    }
-                    current_province["children"].append(current_city)
-                    active_entity = current_city
-                    active_field = "text_detail"
-                    current_district = None
-                    continue
-                
-                if current_city and H3_SPECIAL_ZERO_PATTERN.match(line):
-                    flush_buffer()
-                    active_entity = current_city
-                    active_field = "text_general"
-                    continue
-
-                match_h3 = H3_MD_PATTERN.match(line)
-                if current_city and match_h3:
-                    flush_buffer()
-                    h3_name = match_h3.group(2).strip()
-                    current_district = {
-                        "name": h3_name, "level": 3,
-                        "parent_name": current_city["name"],
-                        "parent_adcode": None, # 这里改为 None，在link_data中填充
-                        "adcode": None, "text_general": "",
-                        "text_detail": "", "geometry": None
-                    }
-                    if "children" not in current_city: current_city["children"] = [] 
-                    current_city["children"].append(current_district)
-                    active_entity = current_district
-                    active_field = "text_detail"
-                    continue
-                
-                current_text_buffer.append(line_content.strip('\n'))
-
-            flush_buffer()
-
-    except FileNotFoundError:
-        print(f"Error: Markdown file '{md_filepath}' not found.")
-        return []
-    except Exception as e:
-        print(f"An error occurred while parsing Markdown: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
-        
-    # print(f"Markdown parsing complete. Found {len(processed_data)} provinces.") # 移除调试打印
-    return processed_data
-
-def load_shapefiles() -> Dict[str, gpd.GeoDataFrame]:
-    shapefiles = {}
-    try:
-        if os.path.exists(COUNTRY_SHP_PATH):
-            shapefiles["country"] = gpd.read_file(COUNTRY_SHP_PATH)
-        if os.path.exists(PROVINCE_SHP_PATH):
-            shapefiles["province"] = gpd.read_file(PROVINCE_SHP_PATH)
-        if os.path.exists(CITY_SHP_PATH):
-            shapefiles["city"] = gpd.read_file(CITY_SHP_PATH)
-        if os.path.exists(DISTRICT_SHP_PATH):
-            shapefiles["district"] = gpd.read_file(DISTRICT_SHP_PATH)
-    except Exception as e:
-        print(f"Error loading shapefiles: {e}")
-    return shapefiles
-
-def normalize_name(name: str) -> str:
-    if name is None:
-        return ""
-    return name.strip() # 仅去除前后空格，不再移除后缀
-
-def link_data(md_data: ProcessedData, shp_data: Dict[str, gpd.GeoDataFrame]) -> ProcessedData:
-    # print("--- Inside link_data ---") # 移除调试打印
-    essential_shp_loaded_and_not_empty = (
-        "province" in shp_data and shp_data["province"] is not None and not shp_data["province"].empty and
-        "city" in shp_data and shp_data["city"] is not None and not shp_data["city"].empty and
-        "district" in shp_data and shp_data["district"] is not None and not shp_data["district"].empty
-    )
-    if not md_data or not essential_shp_loaded_and_not_empty:
-        # print("Missing or empty data for linking. Aborting linking.") # 移除调试打印
-        return md_data
-    # print("Preconditions PASSED. Proceeding with linking logic...") # 移除调试打印
-
-    gdf_provinces = shp_data["province"]
-    gdf_cities = shp_data["city"]
-    gdf_districts = shp_data["district"]
-
-    # 预先标准化 shapefile 的名称列
-    gdf_provinces['pr_name_normalized'] = gdf_provinces['pr_name'].astype(str).apply(normalize_name)
-    gdf_cities['ct_name_normalized'] = gdf_cities['ct_name'].astype(str).apply(normalize_name)
-    gdf_districts['dt_name_normalized'] = gdf_districts['dt_name'].astype(str).apply(normalize_name)
-
-    # 使用字典存储已链接的区域，方便按adcode查找 (为第二遍填充parent_adcode做准备)
-    linked_regions_by_adcode: Dict[Any, AdministrativeRegion] = {}
-    
-    # 第一次遍历：链接所有层级的自身adcode和geometry
-    for province_md in md_data:
-        prov_name_for_match = province_md["name"].strip()
-        
-        match_condition_series_prov = gdf_provinces['pr_name_normalized'] == prov_name_for_match
-        matched_prov_shp = gdf_provinces[match_condition_series_prov]
-
-        if not matched_prov_shp.empty:
-            province_shp_row = matched_prov_shp.iloc[0]
-            province_md["adcode"] = province_shp_row["pr_adcode"]
-            province_md["geometry"] = province_shp_row.geometry
-            linked_regions_by_adcode[province_md["adcode"]] = province_md # 存储已链接的省份
-            # print(f"SUCCESS: Linked Province '{province_md['name']}' to Adcode: {province_md['adcode']} and Geometry.") # 移除调试打印
-        # else:
-            # print(f"FAILED: Failed to link Province: '{province_md['name']}' (MD Name: '{prov_name_for_match}') - No matching shapefile entry found after normalization.") # 移除调试打印
-
-        for city_md in province_md.get("children", []):
-            city_name_for_match = city_md["name"].strip()
-            
-            # 使用已链接的省份adcode进行筛选
-            parent_province_adcode = province_md.get("adcode")
-            if parent_province_adcode is None:
-                # print(f"WARNING: City '{city_md['name']}' parent province adcode is None. Skipping city linking.") # 移除调试打印
-                continue
-
-            potential_cities_shp = gdf_cities[gdf_cities['pr_adcode'] == parent_province_adcode]
-            match_condition_series_city = potential_cities_shp['ct_name_normalized'] == city_name_for_match
-            matched_city_shp = potential_cities_shp[match_condition_series_city]
-
-            if not matched_city_shp.empty:
-                city_shp_row = matched_city_shp.iloc[0]
-                city_md["adcode"] = city_shp_row["ct_adcode"]
-                city_md["geometry"] = city_shp_row.geometry
-                linked_regions_by_adcode[city_md["adcode"]] = city_md # 存储已链接的城市
-                # print(f"SUCCESS: Linked City '{city_md['name']}' to Adcode: {city_md['adcode']}.") # 移除调试打印
-            # else:
-                # print(f"FAILED: Failed to link City: '{city_md['name']}' (MD Name: '{city_name_for_match}') - No matching shapefile entry for parent_adcode {province_md.get('adcode')}.") # 移除调试打印
-
-            for district_md in city_md.get("children", []):
-                dist_name_for_match = district_md["name"].strip()
-
-                # 使用已链接的城市adcode进行筛选
-                parent_city_adcode = city_md.get("adcode")
-                if parent_city_adcode is None:
-                    # print(f"WARNING: District '{district_md['name']}' parent city adcode is None. Skipping district linking.") # 移除调试打印
-                    continue
-
-                potential_districts_shp = gdf_districts[gdf_districts['ct_adcode'] == parent_city_adcode]
-                match_condition_series_dist = potential_districts_shp['dt_name_normalized'] == dist_name_for_match
-                matched_district_shp = potential_districts_shp[match_condition_series_dist]
-
-                if not matched_district_shp.empty:
-                    district_shp_row = matched_district_shp.iloc[0]
-                    district_md["adcode"] = district_shp_row["dt_adcode"]
-                    district_md["geometry"] = district_shp_row.geometry
-                    linked_regions_by_adcode[district_md["adcode"]] = district_md # 存储已链接的区县
-                    # print(f"SUCCESS: Linked District '{district_md['name']}' to Adcode: {district_md['adcode']}.") # 移除调试打印
-                # else:
-                    # print(f"FAILED: Failed to link District: '{district_md['name']}' (MD Name: '{dist_name_for_match}') - No matching shapefile entry for parent_adcode {city_md.get('adcode')}.") # 移除调试打印
-
-    # 第二次遍历：填充 parent_adcode
-    # print("\n--- Second pass: Populating parent_adcode ---") # 移除调试打印
-    for province_md in md_data:
-        for city_md in province_md.get("children", []):
-            # 只有当城市和省份都有adcode时才设置parent_adcode
-            if city_md.get("adcode") is not None and province_md.get("adcode") is not None:
-                city_md["parent_adcode"] = province_md["adcode"]
-                # print(f"Set parent_adcode for City '{city_md['name']}' to {city_md['parent_adcode']}") # 移除调试打印
-            
-            for district_md in city_md.get("children", []):
-                # 只有当区县和城市都有adcode时才设置parent_adcode
-                if district_md.get("adcode") is not None and city_md.get("adcode") is not None:
-                    district_md["parent_adcode"] = city_md["adcode"]
-                    # print(f"Set parent_adcode for District '{district_md['name']}' to {district_md['parent_adcode']}") # 移除调试打印
-
-    # print("--- Data linking loop finished. ---") # 移除调试打印
-    return md_data
-
-def main_data_processing():
-    # print("--- Entering main_data_processing ---") # 移除调试打印
-    # print("--- Calling parse_markdown ---") # 移除调试打印
-    parsed_md = parse_markdown(MD_FILE_PATH)
-    # print(f"--- Returned from parse_markdown. parsed_md is {'None or empty' if not parsed_md else 'Populated'} ---") # 移除调试打印
-    if not parsed_md:
-        print("Markdown parsing failed. Exiting.")
-        return None
-    # print("--- Calling load_shapefiles ---") # 移除调试打印
-    shapefile_data = load_shapefiles()
-    # print(f"--- Returned from load_shapefiles. shapefile_data keys: {list(shapefile_data.keys()) if shapefile_data else 'None or empty'} ---") # 移除调试打印
-    required_shp_keys = ["country", "province", "city", "district"]
-    missing_keys = [key for key in required_shp_keys if key not in shapefile_data or shapefile_data[key] is None or shapefile_data[key].empty]
-    if missing_keys:
-        print(f"Shapefile loading incomplete or essential shapefiles are empty. Missing/Empty keys: {missing_keys}. Exiting.")
-        return None
-    # print("--- Calling link_data ---") # 移除调试打印
-    linked_data_structure = link_data(parsed_md, shapefile_data)
-    # print("--- Returned from link_data ---") # 移除调试打印
-    return linked_data_structure
-
-# --- Color Configuration for Maps ---
-LEVEL_COLORS = {
-    0: 'lightgrey',  # 国家
-    1: '#FF7F7F',    # 省
-    2: '#FFFFBF',    # 市
-    3: '#7FBFFF',    # 县
-    'default': 'lightgrey',
-    'edge': 'black'
-}
-
 # --- GUI Application Class ---
+HOVER_CELL_PIXELS = 4     # 悬停提示按多少像素见方的格子缓存查询结果
+HOVER_CACHE_SIZE = 4096   # 悬停提示最多缓存多少个格子
+
 class MapViewer(QWidget):
     """Widget to display maps with main map and optional mini-map."""
+    region_clicked = Signal(object)  # 点击地图时包含该点的最深一级区域
+
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.figure = Figure(figsize=(8, 6))
+        # 绘制交给 MapRenderer，本控件负责画布、局部重绘和鼠标交互
+        self.renderer = MapRenderer(Figure(figsize=(8, 6)), animated=True)
+        self.figure = self.renderer.figure
+        self.ax_main = self.renderer.ax_main
+        self.ax_mini = self.renderer.ax_mini
         self.canvas = FigureCanvas(self.figure)
-        
-        # 创建主地图axes (占据大部分空间)
-        self.ax_main = self.figure.add_subplot(111)
-        # 创建小地图axes (左上角)
-        self.ax_mini = self.figure.add_axes([0.02, 0.7, 0.25, 0.25])
-        
-        self._setup_axes_style(self.ax_main)
-        self._setup_axes_style(self.ax_mini)
-        
+
         layout = QVBoxLayout(self)
         layout.addWidget(self.canvas)
         self.setMinimumSize(500, 400)
-        
-        # 存储当前显示的数据，用于小地图
-        self.current_region = None
-        self.all_shapefiles = None
-
-    def _setup_axes_style(self, ax):
-        """设置axes的基本样式"""
-        ax.set_xticks([])
-        ax.set_yticks([])
-        for spine in ax.spines.values():
-            spine.set_visible(False)
-
-    def set_shapefiles_reference(self, shapefiles_dict: Dict[str, gpd.GeoDataFrame]):
+
+        self.spatial_index: Optional[RegionSpatialIndex] = None
+
+        # 局部重绘：静态部分（小地图背景等）在 draw_event 时截取，主地图区域和小地图高亮作为动画artist单独绘制
+        self._blit_background = None
+        self._mini_blit_background = None
+        self._hover_background = None  # 含动画artist、不含提示框的画面
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('button_press_event', self._on_click)
+
+        # 悬停提示：动画文本artist，只做局部重绘；查询结果按光标所在格子缓存
+        self._tooltip = self.figure.text(0, 0, "", transform=IdentityTransform(), animated=True, visible=False,
+                                         fontsize=9, va='bottom',
+                                         bbox=dict(boxstyle='round', facecolor='lightyellow', alpha=0.9))
+        self._hover_cell = None
+        self._hover_cache: OrderedDict = OrderedDict()
+        self._tooltip_extent = None  # 上一次提示框占据的像素范围
+        self.canvas.mpl_connect('motion_notify_event', self._on_motion)
+        self.canvas.mpl_connect('figure_leave_event', lambda event: self._hide_tooltip())
+
+    @property
+    def current_region(self) -> Optional[AdministrativeRegion]:
+        return self.renderer.current_region
+
+    def set_shapefiles_reference(self, shapefiles_dict: ShapefileData):
         """设置shapefile数据引用，用于小地图显示"""
-        self.all_shapefiles = shapefiles_dict
+        self.renderer.set_shapefiles_reference(shapefiles_dict)
+
+    def set_geometry_pyramid(self, pyramid: Optional[GeometryPyramid]):
+        """设置多分辨率几何，绘图时按显示比例选用简化几何"""
+        self.renderer.set_geometry_pyramid(pyramid)
+
+    def set_region_index(self, region_index: Optional[RegionIndex]):
+        """设置区划查找表，小地图按上级adcode直接取下级行区间"""
+        self.renderer.set_region_index(region_index)
+
+    def set_spatial_index(self, spatial_index: Optional[RegionSpatialIndex]):
+        """设置空间索引，点击地图时据此识别区域"""
+        self.spatial_index = spatial_index
+
+    def _on_click(self, event):
+        """主地图或小地图上左键点击：查找包含点击位置的最深一级区域"""
+        # 索引仍在后台建立时忽略点击，不在界面线程中加载图层和建树
+        if self.spatial_index is None or event.button != 1 or not self.spatial_index.is_ready():
+            return
+        if event.inaxes not in (self.ax_main, self.ax_mini) or event.xdata is None or event.ydata is None:
+            return
+        try:
+            region = self.spatial_index.region_at(event.xdata, event.ydata)
+        except Exception as e:
+            print(f"Error identifying clicked region: {e}")
+            return
+        if region is not None:
+            self.region_clicked.emit(region)
+
+    def _hover_layer(self) -> str:
+        """当前显示的图层：主地图和小地图都显示当前区域这一级（默认视图为省级）"""
+        if self.current_region:
+            return LEVEL_LAYERS.get(self.current_region.get("level"), "province")
+        return "province"
+
+    def _on_motion(self, event):
+        """鼠标移动：光标进入新格子时查询所在区域并局部重绘提示"""
+        if self.spatial_index is None or self._hover_background is None:
+            return
+        if event.inaxes not in (self.ax_main, self.ax_mini) or event.xdata is None or event.ydata is None:
+            self._hide_tooltip()
+            return
+        if not self.spatial_index.is_ready():
+            self._hover_cell = None
+            self._show_tooltip(event, "地图索引加载中...")
+            return
+        layer = self._hover_layer()
+        cell = (event.inaxes is self.ax_mini, layer,
+                int(event.x) // HOVER_CELL_PIXELS, int(event.y) // HOVER_CELL_PIXELS)
+        if cell == self._hover_cell:
+            return
+        self._hover_cell = cell
+        if cell in self._hover_cache:
+            self._hover_cache.move_to_end(cell)
+            feature = self._hover_cache[cell]
+        else:
+            try:
+                feature = self.spatial_index.feature_at(layer, event.xdata, event.ydata)
+            except Exception as e:
+                print(f"Error querying hovered region: {e}")
+                feature = None
+            self._hover_cache[cell] = feature
+            if len(self._hover_cache) > HOVER_CACHE_SIZE:
+                self._hover_cache.popitem(last=False)
+
+        if feature is None:
+            self._hide_tooltip()
+            return
+        name, adcode = feature
+        self._show_tooltip(event, f"{name} ({adcode})")
+
+    def _show_tooltip(self, event, text: str):
+        # 靠近右边缘时提示框放在光标左侧，避免超出画布
+        on_right = event.x > self.figure.bbox.width * 0.7
+        self._tooltip.set_text(text)
+        self._tooltip.set_horizontalalignment('right' if on_right else 'left')
+        self._tooltip.set_position((event.x - 10 if on_right else event.x + 10, event.y + 10))
+        self._tooltip.set_visible(True)
+        self._blit_tooltip()
+
+    def _hide_tooltip(self):
+        self._hover_cell = None
+        if self._tooltip.get_visible():
+            self._tooltip.set_visible(False)
+            if self._hover_background is not None:
+                self._blit_tooltip()
+
+    def _blit_tooltip(self):
+        """只重绘提示框：恢复不含提示的画面，只刷新新旧提示框覆盖的区域"""
+        self.canvas.restore_region(self._hover_background)
+        extents = [self._tooltip_extent] if self._tooltip_extent is not None else []
+        self._tooltip_extent = None
+        if self._tooltip.get_visible():
+            self.figure.draw_artist(self._tooltip)
+            self._tooltip_extent = self._tooltip.get_bbox_patch().get_window_extent().padded(2)
+            extents.append(self._tooltip_extent)
+        if extents:
+            self.canvas.blit(Bbox.union(extents))
+
+    def _reset_hover(self):
+        """视图变化后格子对应的地图位置随之改变，清空缓存并隐藏提示"""
+        self._hover_cell = None
+        self._hover_cache.clear()
+        self._tooltip.set_visible(False)
+        self._tooltip_extent = None
 
     def display_geometry(self, geometry_to_plot: Optional[Any], 
                         region_data: Optional[AdministrativeRegion] = None,
@@ -358,286 +191,586 @@ class MapViewer(QWidget):
                         edge_color: str = LEVEL_COLORS['edge'], 
                         fit_bounds: bool = True):
         """显示主地图和小地图"""
-        self.current_region = region_data
-        
-        # 清空两个axes
-        self.ax_main.clear()
-        self.ax_mini.clear()
-        self._setup_axes_style(self.ax_main)
-        self._setup_axes_style(self.ax_mini)
-        
-        # 显示主地图
-        self._plot_main_map(geometry_to_plot, fill_color, edge_color, fit_bounds)
-        
-        # 显示小地图
-        self._plot_mini_map()
-        
-        self.canvas.draw()
-
-    def _plot_main_map(self, geometry_to_plot, fill_color, edge_color, fit_bounds):
-        """绘制主地图"""
-        can_plot = self._can_plot_geometry(geometry_to_plot)
-        
-        if can_plot:
-            try:
-                if isinstance(geometry_to_plot, (gpd.GeoDataFrame, gpd.GeoSeries)):
-                    plotted_geom = geometry_to_plot
-                else:
-                    plotted_geom = gpd.GeoSeries([geometry_to_plot])
+        renderer = self.renderer
+        renderer.current_region = region_data
+        self._reset_hover()
+
+        # 按显示比例选用简化几何的缓存路径
+        main_path = renderer.region_path(geometry_to_plot, region_data)
+        mini_scene = renderer.mini_scene()
+
+        # 小地图背景不变时（例如切换同级区域）只重绘变化的artist
+        if (main_path is not None and self._blit_background is not None and renderer.main_artist is not None
+                and (mini_scene[0] if mini_scene else None) is renderer.scene_background):
+            renderer.update_main_artist(main_path, geometry_to_plot, fill_color, edge_color, fit_bounds)
+            renderer.update_mini_highlight(mini_scene)
+            self._blit()
+            return
 
-                plotted_geom.plot(ax=self.ax_main, edgecolor=edge_color, color=fill_color)
+        # 清空两个axes后完整重绘
+        self._reset_axes()
+        renderer.draw_scene(main_path, geometry_to_plot, fill_color, edge_color, fit_bounds, mini_scene)
+        self.canvas.draw()
 
-                if fit_bounds:
-                    self._fit_bounds(self.ax_main, plotted_geom)
+    def _reset_axes(self):
+        """清空两个axes及局部重绘状态"""
+        self.renderer.reset_axes()
+        self._blit_background = None
+        self._mini_blit_background = None
+        self._hover_background = None
+
+    def _on_draw(self, event):
+        """完整重绘后截取静态背景，再在其上绘制动画artist"""
+        # 完整重绘可能来自窗口缩放，像素格子不再对应原来的位置
+        self._reset_hover()
+        self._blit_background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._mini_blit_background = self.canvas.copy_from_bbox(self.ax_mini.bbox)
+        self._draw_animated()
+        self._hover_background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def _draw_animated(self):
+        main_artist, mini_highlight = self.renderer.main_artist, self.renderer.mini_highlight
+        if main_artist is not None:
+            self.ax_main.apply_aspect()
+            self.figure.draw_artist(main_artist)
+            # 小地图叠在主地图之上，恢复小地图区域以盖住主地图的越界部分
+            self.canvas.restore_region(self._mini_blit_background)
+        if mini_highlight is not None and mini_highlight.get_visible():
+            self.figure.draw_artist(mini_highlight)
+
+    def _blit(self):
+        self.canvas.restore_region(self._blit_background)
+        self._draw_animated()
+        self._hover_background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.canvas.blit(self.figure.bbox)
 
-                self.ax_main.set_aspect('equal', adjustable='box')
-            except Exception as e:
-                print(f"Error plotting main geometry: {e}")
-                self.ax_main.text(0.5, 0.5, "无法绘制地图数据", ha='center', va='center')
-        else:
-            self.ax_main.text(0.5, 0.5, "无有效地理数据可显示", ha='center', va='center')
+    def display_world_with_china(self, china_gdf: Optional[gpd.GeoDataFrame]):
+        """显示中国地图（用于默认视图）"""
+        self._reset_axes()
+        self._reset_hover()
+        self.renderer.draw_default_view(china_gdf)
+        self.canvas.draw()
 
-    def _plot_mini_map(self):
-        """绘制小地图 - 显示上级区域和当前区域位置"""
-        if not self.current_region or not self.all_shapefiles:
-            return
-            
-        current_level = self.current_region.get("level")
-        
+SEARCH_DEBOUNCE_MS = 250        # 输入停止多久后才发起搜索
+SEARCH_RESULT_BATCH_SIZE = 100  # 结果分批送回界面，避免一次性插入大量条目
+SEARCH_RESULT_PAGE_SIZE = 200   # 结果列表每次载入的行数，滚动到底部时再载入下一页
+SEARCH_SORT_MODES = ["默认顺序", "按级别", "按上级区域"]
+LEVEL_TEXTS = {1: "省", 2: "市", 3: "区/县"}
+
+class SearchSignals(QObject):
+    """后台搜索任务的信号（在界面线程中创建，跨线程投递到界面）"""
+    results_ready = Signal(int, object)  # 搜索序号, 一批结果
+    finished = Signal(int, int)          # 搜索序号, 结果总数
+
+class SearchTask(QRunnable):
+    """在 QThreadPool 中执行一次搜索，search_func 每产出一批结果就通过信号送回"""
+    def __init__(self, generation: int, query: str, search_func: Callable,
+                 signals: SearchSignals, is_stale: Callable[[], bool]):
+        super().__init__()
+        self.generation = generation
+        self.query = query
+        self.search_func = search_func
+        self.signals = signals
+        self.is_stale = is_stale
+
+    def run(self):
+        total = 0
         try:
-            if current_level == 1:  # 省级 - 小地图显示全国
-                self._show_country_with_province()
-            elif current_level == 2:  # 市级 - 小地图显示省内
-                self._show_province_with_city()
-            elif current_level == 3:  # 区县级 - 小地图显示市内
-                self._show_city_with_district()
-            else: # 如果没有匹配的层级，小地图可能不显示，或者显示一个空白的中国地图
-                if "country" in self.all_shapefiles and not self.all_shapefiles["country"].empty:
-                    self.all_shapefiles["country"].plot(ax=self.ax_mini, color=LEVEL_COLORS[0],
-                                                        edgecolor=LEVEL_COLORS['edge'], alpha=0.5)
-                    self._fit_bounds(self.ax_mini, self.all_shapefiles["country"])
+            for batch in self.search_func(self.query, self.is_stale):
+                if self.is_stale():
+                    return
+                self.signals.results_ready.emit(self.generation, batch)
+                total += len(batch)
         except Exception as e:
-            print(f"Error plotting mini map: {e}")
-
-    def _show_country_with_province(self):
-        """小地图：显示全国边界及当前省份位置"""
-        if "country" not in self.all_shapefiles or "province" not in self.all_shapefiles:
-            return
-            
-        country_gdf = self.all_shapefiles["country"]
-        province_gdf = self.all_shapefiles["province"]
-        
-        # 显示国家边界
-        country_gdf.plot(ax=self.ax_mini, color=LEVEL_COLORS['default'], 
-                        edgecolor=LEVEL_COLORS['edge'], alpha=0.7)
-        
-        # 高亮当前省份
-        current_adcode = self.current_region.get("adcode")
-        if current_adcode and 'pr_adcode' in province_gdf.columns:
-            current_prov = province_gdf[province_gdf['pr_adcode'] == current_adcode]
-            if not current_prov.empty:
-                current_prov.plot(ax=self.ax_mini, color=LEVEL_COLORS[1], 
-                                edgecolor=LEVEL_COLORS['edge'])
-        
-        self._fit_bounds(self.ax_mini, country_gdf)
-
-    def _show_province_with_city(self):
-        """小地图：显示省边界及当前市位置"""
-        if "city" not in self.all_shapefiles:
-            return
-            
-        city_gdf = self.all_shapefiles["city"]
-        parent_adcode = self.current_region.get("parent_adcode") # 现在这里应该能正确获取到parent_adcode了
-        
-        if parent_adcode and 'pr_adcode' in city_gdf.columns:
-            # 获取同省的所有市
-            province_cities = city_gdf[city_gdf['pr_adcode'] == parent_adcode]
-            if not province_cities.empty:
-                # 显示省内所有市（灰色）
-                province_cities.plot(ax=self.ax_mini, color=LEVEL_COLORS['default'], 
-                                   edgecolor=LEVEL_COLORS['edge'], alpha=0.7)
-                
-                # 高亮当前市
-                current_adcode = self.current_region.get("adcode")
-                if current_adcode and 'ct_adcode' in city_gdf.columns:
-                    current_city = city_gdf[city_gdf['ct_adcode'] == current_adcode]
-                    if not current_city.empty:
-                        current_city.plot(ax=self.ax_mini, color=LEVEL_COLORS[2], 
-                                        edgecolor=LEVEL_COLORS['edge'])
-                
-                self._fit_bounds(self.ax_mini, province_cities)
-
-    def _show_city_with_district(self):
-        """小地图：显示市边界及当前区县位置"""
-        if "district" not in self.all_shapefiles:
-            return
-            
-        district_gdf = self.all_shapefiles["district"]
-        parent_adcode = self.current_region.get("parent_adcode") # 现在这里应该能正确获取到parent_adcode了
-        
-        if parent_adcode and 'ct_adcode' in district_gdf.columns:
-            # 获取同市的所有区县
-            city_districts = district_gdf[district_gdf['ct_adcode'] == parent_adcode]
-            if not city_districts.empty:
-                # 显示市内所有区县（灰色）
-                city_districts.plot(ax=self.ax_mini, color=LEVEL_COLORS['default'], 
-                                  edgecolor=LEVEL_COLORS['edge'], alpha=0.7)
-                
-                # 高亮当前区县
-                current_adcode = self.current_region.get("adcode")
-                if current_adcode and 'dt_adcode' in district_gdf.columns:
-                    current_district = district_gdf[district_gdf['dt_adcode'] == current_adcode]
-                    if not current_district.empty:
-                        current_district.plot(ax=self.ax_mini, color=LEVEL_COLORS[3], 
-                                            edgecolor=LEVEL_COLORS['edge'])
-                
-                self._fit_bounds(self.ax_mini, city_districts)
-
-    def _can_plot_geometry(self, geometry):
-        """检查几何数据是否可以绘制"""
-        if geometry is not None:
-            if hasattr(geometry, 'empty'): 
-                return not geometry.empty
-            elif hasattr(geometry, 'is_empty'): 
-                return not geometry.is_empty
-            else: 
-                return True
-        return False
+            print(f"Error running search for '{self.query}': {e}")
+        if not self.is_stale():
+            self.signals.finished.emit(self.generation, total)
+
+class DataLoadSignals(QObject):
+    """后台数据加载的各阶段信号，界面据此逐步启用浏览、搜索和详情"""
+    progress = Signal(int, str)             # 百分比, 当前步骤
+    regions_parsed = Signal(object, object)  # 区域树, 地名索引
+    data_linked = Signal(object)             # 已链接地图的区域树
+    fulltext_ready = Signal(object)          # 全文索引
+    failed = Signal(str)
+    finished = Signal()
+
+class DataLoadTask(QRunnable):
+    """在后台线程中解析文本、加载图层、链接数据并建立索引"""
+    def __init__(self, signals: DataLoadSignals):
+        super().__init__()
+        self.signals = signals
 
-    def _fit_bounds(self, ax, gdf):
-        """调整axes的显示范围"""
+    def run(self):
         try:
-            minx, miny, maxx, maxy = gdf.total_bounds
-            # 防止无效边界，例如单点几何体或空几何体
-            if not (pd.isna(minx) or pd.isna(miny) or pd.isna(maxx) or pd.isna(maxy)):
-                padding_x = (maxx - minx) * 0.1 if (maxx - minx) > 0 else 0.1
-                padding_y = (maxy - miny) * 0.1 if (maxy - miny) > 0 else 0.1
-                
-                # 针对边界为零的情况增加一个小的固定缓冲
-                if padding_x == 0: padding_x = 0.1
-                if padding_y == 0: padding_y = 0.1
-
-                ax.set_xlim(minx - padding_x, maxx + padding_x)
-                ax.set_ylim(miny - padding_y, maxy + padding_y)
-                ax.set_aspect('equal', adjustable='box')
-            # else: # 移除调试打印
-                # print(f"Fit bounds for ax {ax}: Invalid bounds (contains NaN). Cannot fit.") # 移除调试打印
+            self._load()
         except Exception as e:
-            print(f"Error fitting bounds for ax {ax}: {e}")
-
-    def display_world_with_china(self, china_gdf: Optional[gpd.GeoDataFrame]):
-        """显示中国地图（用于默认视图）"""
-        self.ax_main.clear()
-        self.ax_mini.clear()
-        self._setup_axes_style(self.ax_main)
-        self._setup_axes_style(self.ax_mini)
-        
+            print(f"Error loading data: {e}")
+            self.signals.failed.emit(str(e))
+        self.signals.finished.emit()
+
+    def _load(self):
+        signals = self.signals
+        data = main_data_processing(
+            progress=signals.progress.emit,
+            on_parsed=lambda regions: signals.regions_parsed.emit(regions, NameSearchIndex(regions)))
+        if not data:
+            signals.failed.emit("数据加载失败或为空")
+            return
+        signals.data_linked.emit(data)
+
+        # 提前读取（或开始生成）简化几何，避免首次绘图时在界面线程中读取
+        signals.progress.emit(80, "正在准备多分辨率地图...")
+        pyramid = get_geometry_pyramid()
+        for layer in SHAPEFILE_PATHS:
+            pyramid.layer(layer, 1)
+        get_region_spatial_index().warm_up()
+
+        signals.progress.emit(90, "正在建立全文索引...")
+        signals.fulltext_ready.emit(FullTextIndex.load_or_build(FULLTEXT_INDEX_PATH, data))
+        signals.progress.emit(100, "加载完成")
+
+def result_region(result: Any) -> Region:
+    """搜索结果对应的区域（全文检索结果为 FullTextHit）"""
+    return result.region if isinstance(result, FullTextHit) else result
+
+def province_of(region: Region) -> Region:
+    while region.parent is not None:
+        region = region.parent
+    return region
+
+class SearchResultsModel(QAbstractItemModel):
+    """搜索结果列表模型：直接引用结果数组，不为每行创建条目，按页载入。
+
+    可按级别或上级区域排序，也可按省分组（分组为第一层，结果为第二层）。
+    顶层行的 internalId 为 0，分组下结果行的 internalId 为分组行号 + 1。
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.results: List[Any] = []
+        self.sort_mode = 0
+        self.group_by_province = False
+        self._order: List[int] = []                        # 不分组时的显示顺序（结果下标）
+        self._groups: List[Tuple[Region, List[int]]] = []  # 分组时：(省, 结果下标)
+        self._fetched_top = 0
+        self._fetched_children: Dict[int, int] = {}
+        self._placeholder: Optional[str] = None
+        self._changing = False  # 正在修改并发出通知
+
+    @contextmanager
+    def _resetting(self):
+        self._changing = True
         try:
-            # 始终使用简单的matplotlib绘图，不再依赖Cartopy
-            if china_gdf is not None and not china_gdf.empty:
-                china_gdf.plot(ax=self.ax_main, color=LEVEL_COLORS[0], 
-                             edgecolor=LEVEL_COLORS['edge'])
-                self._fit_bounds(self.ax_main, china_gdf)
-            else:
-                self.ax_main.text(0.5, 0.5, "中国地图数据缺失", ha='center', va='center')
-            
-        except Exception as e:
-            print(f"Error creating China map: {e}")
-            if china_gdf is not None and not china_gdf.empty:
-                china_gdf.plot(ax=self.ax_main, color=LEVEL_COLORS[0], 
-                             edgecolor=LEVEL_COLORS['edge'])
-                self._fit_bounds(self.ax_main, china_gdf)
+            self.beginResetModel()
+            yield
+            self.endResetModel()
+        finally:
+            self._changing = False
+
+    @contextmanager
+    def _inserting(self, parent: QModelIndex, first: int, last: int):
+        self._changing = True
+        try:
+            self.beginInsertRows(parent, first, last)
+            yield
+            self.endInsertRows()
+        finally:
+            self._changing = False
+
+    def clear(self):
+        with self._resetting():
+            self.results = []
+            self._order = []
+            self._groups = []
+            self._fetched_top = 0
+            self._fetched_children = {}
+            self._placeholder = None
+
+    def append_results(self, results: List[Any]):
+        """追加一批结果；默认顺序且不分组时只在末尾追加，否则重新排序/分组"""
+        if self._placeholder is not None:
+            self.clear()
+        start = len(self.results)
+        self.results.extend(results)
+        if self.sort_mode == 0 and not self.group_by_province:
+            self._order.extend(range(start, len(self.results)))
+            # 第一页直接显示，其余等视图滚动到底部时再载入
+            if self._fetched_top < SEARCH_RESULT_PAGE_SIZE:
+                self._fetch_top(SEARCH_RESULT_PAGE_SIZE - self._fetched_top)
+        else:
+            self._rebuild()
+
+    def finish_results(self):
+        """一次搜索的结果全部送达；全文检索命中按文档顺序陆续送达，此时再按相关度排列"""
+        if self.results and isinstance(self.results[0], FullTextHit):
+            self.results.sort(key=lambda hit: -hit.score)
+            self._rebuild()
+
+    def set_placeholder(self, text: str):
+        """没有结果时显示的提示行"""
+        with self._resetting():
+            self._placeholder = text
+
+    def set_sort_mode(self, mode: int):
+        self.sort_mode = mode
+        self._rebuild()
+
+    def set_group_by_province(self, enabled: bool):
+        self.group_by_province = enabled
+        self._rebuild()
+
+    def _sort_key(self, position: int):
+        region = result_region(self.results[position])
+        if self.sort_mode == 1:
+            return (region.level, position)
+        return (region.parent_name or "", region.level, position)
+
+    def _rebuild(self):
+        keep = max(self._fetched_top, SEARCH_RESULT_PAGE_SIZE)
+        with self._resetting():
+            order = list(range(len(self.results)))
+            if self.sort_mode:
+                order.sort(key=self._sort_key)
+            if self.group_by_province:
+                groups: Dict[Region, List[int]] = {}
+                for position in order:
+                    groups.setdefault(province_of(result_region(self.results[position])), []).append(position)
+                self._groups = list(groups.items())
+                self._order = []
             else:
-                 self.ax_main.text(0.5, 0.5, "中国地图数据不可用", ha='center', va='center')
-        
-        # 小地图在默认视图下也显示中国轮廓
-        if china_gdf is not None and not china_gdf.empty:
-            china_gdf.plot(ax=self.ax_mini, color=LEVEL_COLORS[0], 
-                         edgecolor=LEVEL_COLORS['edge'], alpha=0.5)
-            self._fit_bounds(self.ax_mini, china_gdf)
-        
-        self.canvas.draw()
+                self._groups = []
+                self._order = order
+            self._fetched_top = min(keep, self._top_count())
+            self._fetched_children = {}
+
+    def _top_count(self) -> int:
+        return len(self._groups) if self.group_by_province else len(self._order)
+
+    def _fetch_top(self, count: int):
+        stop = min(self._fetched_top + count, self._top_count())
+        if stop > self._fetched_top:
+            with self._inserting(QModelIndex(), self._fetched_top, stop - 1):
+                self._fetched_top = stop
+
+    def _is_group(self, index: QModelIndex) -> bool:
+        return self.group_by_province and index.isValid() and index.internalId() == 0
+
+    def result_at(self, index: QModelIndex) -> Optional[Any]:
+        """行对应的搜索结果；分组行和提示行返回 None"""
+        if not index.isValid() or self._placeholder is not None:
+            return None
+        group_id = index.internalId()
+        if group_id:
+            return self.results[self._groups[group_id - 1][1][index.row()]]
+        if self.group_by_province:
+            return None
+        return self.results[self._order[index.row()]]
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if column != 0 or row < 0 or row >= self.rowCount(parent):
+            return QModelIndex()
+        if parent.isValid():
+            return self.createIndex(row, column, parent.row() + 1)
+        return self.createIndex(row, column, 0)
+
+    def parent(self, index: Optional[QModelIndex] = None):
+        if index is None:  # QObject.parent()
+            return super().parent()
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if not parent.isValid():
+            return 1 if self._placeholder is not None else self._fetched_top
+        if self._is_group(parent):
+            return self._fetched_children.get(parent.row(), 0)
+        return 0
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if not parent.isValid():
+            return self.rowCount(parent) > 0
+        return self._is_group(parent)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        # 视图（或模型测试器）可能在处理本模型的变更通知时调用 fetchMore，此时不能嵌套插入行
+        if self._changing:
+            return False
+        if not parent.isValid():
+            return self._placeholder is None and self._fetched_top < self._top_count()
+        if self._is_group(parent):
+            return self._fetched_children.get(parent.row(), 0) < len(self._groups[parent.row()][1])
+        return False
+
+    def fetchMore(self, parent: QModelIndex):
+        if self._changing:
+            return
+        if not parent.isValid():
+            self._fetch_top(SEARCH_RESULT_PAGE_SIZE)
+        elif self._is_group(parent):
+            fetched = self._fetched_children.get(parent.row(), 0)
+            stop = min(fetched + SEARCH_RESULT_PAGE_SIZE, len(self._groups[parent.row()][1]))
+            if stop > fetched:
+                with self._inserting(parent, fetched, stop - 1):
+                    self._fetched_children[parent.row()] = stop
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.UserRole):
+            return None
+        if self._placeholder is not None:
+            return self._placeholder if role == Qt.DisplayRole else None
+        if self._is_group(index):
+            province, members = self._groups[index.row()]
+            return f"{province.name} ({len(members)})" if role == Qt.DisplayRole else None
+        result = self.result_at(index)
+        if role == Qt.UserRole:
+            return result
+        region = result_region(result)
+        result_text = f"{region.name} ({LEVEL_TEXTS.get(region.level, '未知')})"
+        if region.parent_name:
+            result_text += f" - {region.parent_name}"
+        if isinstance(result, FullTextHit):
+            result_text += f"\n{result.snippet}"
+        return result_text
+
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return "搜索结果"
+        return None
 
 class SearchResultsWidget(QWidget):
     """搜索结果显示组件"""
-    result_selected = Signal(dict)
+    result_selected = Signal(object)
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.init_ui()
-        self.search_results = []
     
     def init_ui(self):
         layout = QVBoxLayout(self)
+
+        # 排序和分组
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(SEARCH_SORT_MODES)
+        self.group_checkbox = QCheckBox("按省分组")
+
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(QLabel("搜索结果:"))
+        header_layout.addStretch()
+        header_layout.addWidget(self.sort_combo)
+        header_layout.addWidget(self.group_checkbox)
         
         # 结果列表
         self.results_tree = QTreeView()
-        self.results_model = QStandardItemModel()
-        self.results_model.setHorizontalHeaderLabels(["搜索结果"])
+        self.results_model = SearchResultsModel(self)
         self.results_tree.setModel(self.results_model)
         self.results_tree.clicked.connect(self.on_result_clicked)
+        self.sort_combo.currentIndexChanged.connect(self.results_model.set_sort_mode)
+        self.group_checkbox.toggled.connect(self.results_model.set_group_by_province)
         
-        layout.addWidget(QLabel("搜索结果:"))
+        layout.addLayout(header_layout)
         layout.addWidget(self.results_tree)
+
+    @property
+    def search_results(self) -> List[Any]:
+        return self.results_model.results
     
-    def display_search_results(self, results: List[AdministrativeRegion]):
-        """显示搜索结果"""
-        self.search_results = results
+    def display_search_results(self, results: List[Any]):
+        """显示搜索结果（地名检索为区域列表，全文检索为 FullTextHit 列表）"""
+        self.clear_results()
+        self.append_search_results(results)
+        self.finish_search_results()
+
+    def clear_results(self):
         self.results_model.clear()
-        self.results_model.setHorizontalHeaderLabels(["搜索结果"])
-        
-        if not results:
-            no_result_item = QStandardItem("未找到匹配结果")
-            self.results_model.appendRow(no_result_item)
-            return
-        
-        for i, result in enumerate(results):
-            result_text = f"{result['name']} ({self._get_level_text(result['level'])})"
-            if result.get('parent_name'):
-                result_text += f" - {result['parent_name']}"
-            
-            result_item = QStandardItem(result_text)
-            result_item.setData(i, Qt.UserRole)  # 存储结果索引
-            self.results_model.appendRow(result_item)
-        
-        self.results_tree.expandAll()
-    
-    def _get_level_text(self, level: int) -> str:
-        """获取行政级别的文本描述"""
-        level_map = {1: "省", 2: "市", 3: "区/县"}
-        return level_map.get(level, "未知")
+
+    def append_search_results(self, results: List[Any]):
+        """追加一批搜索结果（后台搜索按批次陆续送达）"""
+        self.results_model.append_results(results)
+
+    def finish_search_results(self):
+        """一次搜索的结果全部送达"""
+        self.results_model.finish_results()
+        if not self.search_results:
+            self.results_model.set_placeholder("未找到匹配结果")
     
     def on_result_clicked(self, index: QModelIndex):
         """处理搜索结果点击事件"""
-        item = self.results_model.itemFromIndex(index)
-        if item and item.data(Qt.UserRole) is not None:
-            result_index = item.data(Qt.UserRole)
-            if 0 <= result_index < len(self.search_results):
-                selected_result = self.search_results[result_index]
-                self.result_selected.emit(selected_result)
+        selected_result = self.results_model.result_at(index)
+        if selected_result is not None:
+            self.result_selected.emit(result_region(selected_result))
+
+class RegionTreeModel(QAbstractItemModel):
+    """直接基于区域树的浏览模型：不创建逐节点的 Qt 对象，下级区域在展开时才通过 fetchMore 载入"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.regions: ProcessedData = []
+        self._fetched: Dict[Optional[Region], int] = {}  # 上级区域（None 为根） -> 已载入的下级数量
+        self._rows: Dict[Region, int] = {}               # 已载入区域 -> 在上级中的行号
+
+    def set_regions(self, regions: ProcessedData):
+        self.beginResetModel()
+        self.regions = regions
+        self._fetched = {}
+        self._rows = {}
+        self.endResetModel()
+
+    def region_from_index(self, index: QModelIndex) -> Optional[Region]:
+        return index.internalPointer() if index.isValid() else None
+
+    def _children_of(self, parent: QModelIndex):
+        region = self.region_from_index(parent)
+        return self.regions if region is None else region.children
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        if column != 0 or row < 0 or row >= self.rowCount(parent):
+            return QModelIndex()
+        return self.createIndex(row, column, self._children_of(parent)[row])
+
+    def parent(self, index: Optional[QModelIndex] = None):
+        if index is None:  # QObject.parent()
+            return super().parent()
+        region = self.region_from_index(index)
+        if region is None or region.parent is None:
+            return QModelIndex()
+        return self.createIndex(self._rows[region.parent], 0, region.parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return self._fetched.get(self.region_from_index(parent), 0)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return len(self._children_of(parent)) > 0
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        return self.rowCount(parent) < len(self._children_of(parent))
+
+    def fetchMore(self, parent: QModelIndex):
+        children = self._children_of(parent)
+        start = self.rowCount(parent)
+        if start >= len(children):
+            return
+        self.beginInsertRows(parent, start, len(children) - 1)
+        for row in range(start, len(children)):
+            self._rows[children[row]] = row
+        self._fetched[self.region_from_index(parent)] = len(children)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        region = self.region_from_index(index)
+        if region is None:
+            return None
+        if role == Qt.DisplayRole:
+            return region.name
+        if role == Qt.UserRole:
+            return region
+        return None
+
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return "行政区划"
+        return None
 
 class MainWindow(QMainWindow):
-    def __init__(self, data_store: Optional[ProcessedData], country_gdf: Optional[gpd.GeoDataFrame]):
+    def __init__(self, data_store: Optional[ProcessedData] = None, country_gdf: Optional[gpd.GeoDataFrame] = None):
+        """data_store 为 None 时窗口先显示国界，数据在后台加载并逐步启用各功能"""
         super().__init__()
-        self.data_store = data_store if data_store else []
+        self.data_store: ProcessedData = []
         self.country_geodataframe = country_gdf
+        # 地名倒排索引在区域树解析后建立；全文索引从磁盘读取并增量更新，就绪前不可用
+        self.name_index = NameSearchIndex(self.data_store)
+        self.fulltext_index: Optional[FullTextIndex] = None
+        self._details_enabled = False
+
+        # 边输入边搜索：防抖计时器 + 后台线程池，过期的查询通过序号作废
+        self._search_generation = 0
+        self.search_signals = SearchSignals(self)
+        self.search_signals.results_ready.connect(self.on_search_results_ready)
+        self.search_signals.finished.connect(self.on_search_finished)
+        self.search_debounce_timer = QTimer(self)
+        self.search_debounce_timer.setSingleShot(True)
+        self.search_debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_debounce_timer.timeout.connect(self.start_search)
         
-        # 加载所有shapefile数据供小地图使用
-        self.all_shapefiles = load_shapefiles()
+        # 与数据处理共享同一份shapefile数据，小地图所需图层按需加载
+        self.all_shapefiles = get_geo_data_store()
 
         self.setWindowTitle("九域真形图 - 行政区沿革查询系统")
         self.setGeometry(100, 100, 1400, 900)
 
         self.init_ui()
         self.load_default_view()
-        if self.data_store:
-            self.populate_browse_tree()
 
         if self.toggle_browse_action.isChecked():
             self.browse_dock_widget.show()
         else:
             self.browse_dock_widget.hide()
 
+        if data_store is None:
+            self.start_data_loading()
+        else:
+            self.on_regions_parsed(data_store, NameSearchIndex(data_store))
+            self.on_data_linked(data_store)
+            # 数据由调用方提前准备好时同样在后台线程中建立空间索引，与 DataLoadTask 的步骤一致
+            QThreadPool.globalInstance().start(get_region_spatial_index().warm_up)
+            self.on_fulltext_ready(FullTextIndex.load_or_build(FULLTEXT_INDEX_PATH, data_store))
+
+    def start_data_loading(self):
+        """在后台加载数据，窗口先以不可用状态显示搜索和浏览"""
+        self.search_input.setEnabled(False)
+        self.search_button.setEnabled(False)
+        self.search_input.setPlaceholderText("正在加载数据...")
+        self.load_progress_bar.setValue(0)
+        self.load_progress_bar.show()
+
+        self.data_load_signals = DataLoadSignals(self)
+        self.data_load_signals.progress.connect(self.on_data_load_progress)
+        self.data_load_signals.regions_parsed.connect(self.on_regions_parsed)
+        self.data_load_signals.data_linked.connect(self.on_data_linked)
+        self.data_load_signals.fulltext_ready.connect(self.on_fulltext_ready)
+        self.data_load_signals.failed.connect(self.on_data_load_failed)
+        self.data_load_signals.finished.connect(self.on_data_load_finished)
+        QThreadPool.globalInstance().start(DataLoadTask(self.data_load_signals))
+
+    def on_data_load_progress(self, percent: int, message: str):
+        self.load_progress_bar.setValue(percent)
+        self.status_bar.showMessage(message)
+
+    def on_regions_parsed(self, data: ProcessedData, name_index: NameSearchIndex):
+        """区域树可用：启用浏览和地名搜索"""
+        self.data_store = data
+        self.name_index = name_index
+        self.populate_browse_tree()
+        self.search_input.setEnabled(True)
+        self.search_button.setEnabled(True)
+        self.on_search_mode_changed(self.search_mode_combo.currentIndex())
+
+    def on_data_linked(self, data: ProcessedData):
+        """地图数据已链接：启用详情显示"""
+        self._details_enabled = True
+
+    def on_fulltext_ready(self, fulltext_index: FullTextIndex):
+        """全文索引可用：启用全文检索模式"""
+        self.fulltext_index = fulltext_index
+        self.search_mode_combo.model().item(1).setEnabled(True)
+
+    def on_data_load_failed(self, message: str):
+        print(f"警告: {message}")
+        self.status_bar.showMessage(f"警告: {message}")
+
+    def on_data_load_finished(self):
+        self.load_progress_bar.hide()
+        print(self.all_shapefiles.format_load_timings())
+        if self._details_enabled:
+            self.status_bar.showMessage(f"系统已就绪 - 共 {len(self.data_store)} 个省级行政区")
+
     def init_ui(self):
         # --- Menu Bar ---
         menubar = self.menuBar()
@@ -665,16 +798,23 @@ class MainWindow(QMainWindow):
         left_layout = QVBoxLayout(left_pane_widget)
         left_layout.setContentsMargins(0,0,0,0)
 
+        self.search_mode_combo = QComboBox()
+        self.search_mode_combo.addItems(["地名", "全文"])
+        self.search_mode_combo.model().item(1).setEnabled(False)  # 全文索引就绪后启用
+        self.search_mode_combo.currentIndexChanged.connect(self.on_search_mode_changed)
+
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("输入地名搜索 (至少2个汉字)...")
         self.search_input.returnPressed.connect(self.perform_search)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         
-        search_button = QPushButton("搜索")
-        search_button.clicked.connect(self.perform_search)
+        self.search_button = QPushButton("搜索")
+        self.search_button.clicked.connect(self.perform_search)
         
         search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_mode_combo)
         search_layout.addWidget(self.search_input)
-        search_layout.addWidget(search_button)
+        search_layout.addWidget(self.search_button)
         
         left_layout.addLayout(search_layout)
 
@@ -694,6 +834,10 @@ class MainWindow(QMainWindow):
         # --- Right Pane (Map) ---
         self.map_viewer = MapViewer()
         self.map_viewer.set_shapefiles_reference(self.all_shapefiles)
+        self.map_viewer.set_region_index(get_region_index())
+        self.map_viewer.set_geometry_pyramid(get_geometry_pyramid())
+        self.map_viewer.set_spatial_index(get_region_spatial_index())
+        self.map_viewer.region_clicked.connect(self.on_map_region_clicked)
         splitter_main.addWidget(self.map_viewer)
 
         # 设置分割器比例
@@ -708,8 +852,7 @@ class MainWindow(QMainWindow):
         browse_layout = QVBoxLayout(browse_widget)
         
         self.browse_tree = QTreeView()
-        self.browse_model = QStandardItemModel()
-        self.browse_model.setHorizontalHeaderLabels(["行政区划"])
+        self.browse_model = RegionTreeModel(self)
         self.browse_tree.setModel(self.browse_model)
         self.browse_tree.clicked.connect(self.on_browse_tree_clicked)
         
@@ -721,78 +864,100 @@ class MainWindow(QMainWindow):
         # --- Status Bar ---
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
+        self.load_progress_bar = QProgressBar()
+        self.load_progress_bar.setRange(0, 100)
+        self.load_progress_bar.setMaximumWidth(200)
+        self.load_progress_bar.hide()
+        self.status_bar.addPermanentWidget(self.load_progress_bar)
         self.status_bar.showMessage("就绪")
 
     def perform_search(self):
-        """执行搜索功能"""
+        """执行搜索功能（回车或点击搜索按钮时立即执行）"""
         query = self.search_input.text().strip()
-        if len(query) < 2:
+        if len(query) < MIN_QUERY_LENGTH:
             QMessageBox.information(self, "搜索提示", "请输入至少2个汉字进行搜索")
             return
-        
-        # 搜索逻辑
-        results = self.search_regions(query)
-        self.search_results_widget.display_search_results(results)
-        
-        if results:
-            self.status_bar.showMessage(f"找到 {len(results)} 个匹配结果")
+        self.start_search()
+
+    def on_search_text_changed(self, text: str):
+        """输入变化时重新计时，停止输入一段时间后才搜索"""
+        self.search_debounce_timer.start()
+
+    def start_search(self):
+        """作废正在进行的查询，并在线程池中发起新的查询"""
+        self.search_debounce_timer.stop()
+        self._search_generation += 1
+        generation = self._search_generation
+        query = self.search_input.text().strip()
+        self.search_results_widget.clear_results()
+        if len(query) < MIN_QUERY_LENGTH:
+            return
+
+        if self.is_fulltext_mode() and self.fulltext_index is not None:
+            fulltext_index = self.fulltext_index
+            search_func = lambda text, should_stop: fulltext_index.iter_search(text, SEARCH_RESULT_BATCH_SIZE, should_stop)
+        else:
+            search_func = lambda text, should_stop: self.search_regions(text)
+        is_stale = lambda: generation != self._search_generation
+        task = SearchTask(generation, query, search_func, self.search_signals, is_stale)
+        self.status_bar.showMessage(f"正在搜索: {query}")
+        QThreadPool.globalInstance().start(task)
+
+    def on_search_results_ready(self, generation: int, results: List[Any]):
+        if generation == self._search_generation:
+            self.search_results_widget.append_search_results(results)
+
+    def on_search_finished(self, generation: int, total: int):
+        if generation != self._search_generation:
+            return
+        self.search_results_widget.finish_search_results()
+        if total:
+            self.status_bar.showMessage(f"找到 {total} 个匹配结果")
         else:
             self.status_bar.showMessage("未找到匹配结果")
 
-    def search_regions(self, query: str) -> List[AdministrativeRegion]:
-        """在数据中搜索匹配的行政区域"""
-        results = []
-        
-        def search_in_region(region: AdministrativeRegion):
-            if query in region['name']:
-                results.append(region)
-            
-            # 递归搜索子区域
-            for child in region.get('children', []):
-                search_in_region(child)
-        
-        # 在所有省份中搜索
-        for province in self.data_store:
-            search_in_region(province)
-        
-        return results
+    def is_fulltext_mode(self) -> bool:
+        return self.search_mode_combo.currentIndex() == 1
+
+    def on_search_mode_changed(self, index: int):
+        """切换地名/全文检索时更新输入提示，并按新模式重新搜索"""
+        if self.is_fulltext_mode():
+            self.search_input.setPlaceholderText("输入关键词检索沿革全文 (至少2个汉字)...")
+        else:
+            self.search_input.setPlaceholderText("输入地名搜索 (至少2个汉字)...")
+        self.start_search()
+
+    def search_regions(self, query: str) -> Iterator[List[AdministrativeRegion]]:
+        """在数据中搜索匹配的行政区域，结果分批产出"""
+        return self.name_index.iter_search(query, SEARCH_RESULT_BATCH_SIZE)
 
     def on_search_result_selected(self, region_data: AdministrativeRegion):
         """处理搜索结果选择事件"""
-        self.display_region_info(region_data)
+        if self.ensure_details_enabled():
+            self.display_region_info(region_data)
+
+    def on_map_region_clicked(self, region_data: AdministrativeRegion):
+        """处理地图点击识别出的区域"""
+        if self.ensure_details_enabled():
+            self.display_region_info(region_data)
+
+    def ensure_details_enabled(self) -> bool:
+        """地图数据尚未链接完成时提示稍候"""
+        if not self._details_enabled:
+            self.status_bar.showMessage("地图数据加载中，请稍候...")
+        return self._details_enabled
 
     def populate_browse_tree(self):
-        """填充浏览树"""
+        """填充浏览树（各级区域在展开时才载入）"""
         if not self.data_store:
             return
-        
-        self.browse_model.clear()
-        self.browse_model.setHorizontalHeaderLabels(["行政区划"])
-        
-        for province in self.data_store:
-            province_item = QStandardItem(province['name'])
-            province_item.setData(province, Qt.UserRole)
-            
-            for city in province.get('children', []):
-                city_item = QStandardItem(city['name'])
-                city_item.setData(city, Qt.UserRole)
-                
-                for district in city.get('children', []):
-                    district_item = QStandardItem(district['name'])
-                    district_item.setData(district, Qt.UserRole)
-                    city_item.appendRow(district_item)
-                
-                province_item.appendRow(city_item)
-            
-            self.browse_model.appendRow(province_item)
+        self.browse_model.set_regions(self.data_store)
 
     def on_browse_tree_clicked(self, index: QModelIndex):
         """处理浏览树点击事件"""
-        item = self.browse_model.itemFromIndex(index)
-        if item:
-            region_data = item.data(Qt.UserRole)
-            if region_data:
-                self.display_region_info(region_data)
+        region_data = self.browse_model.region_from_index(index)
+        if region_data and self.ensure_details_enabled():
+            self.display_region_info(region_data)
 
     def display_region_info(self, region_data: AdministrativeRegion):
         """显示区域信息"""
@@ -899,7 +1064,7 @@ class MainWindow(QMainWindow):
         <ul>
             <li>行政区划地图可视化</li>
             <li>多级行政区划浏览</li>
-            <li>地名搜索功能</li>
+            <li>地名搜索与沿革全文检索</li>
             <li>历史沿革信息展示</li>
         </ul>
         <br>
@@ -914,32 +1079,62 @@ class MainWindow(QMainWindow):
         
         QMessageBox.about(self, "关于九域真形图", about_text)
 
+def convert_maps(force: bool = False) -> bool:
+    """命令行 convert-maps：把各图层转换为带空间索引的 FlatGeobuf"""
+    store = GeoDataStore(SHAPEFILE_PATHS, convert_on_load=False, archives=SHAPEFILE_ARCHIVES)
+    ok = True
+    for layer, path in store.layer_paths.items():
+        if store.source_path(layer) is None:
+            print(f"Skipping '{layer}': {path} not found")
+            continue
+        if not force and store.is_converted(layer):
+            print(f"'{layer}' is up to date: {store.converted_path(layer)}")
+            continue
+        start = time.perf_counter()
+        if store.convert_layer(layer):
+            print(f"Converted '{layer}' -> {store.converted_path(layer)} in {time.perf_counter() - start:.3f}s")
+        else:
+            ok = False
+    return ok
+
 # --- Main Application Function ---
 def main():
-    """主程序入口"""
-    app = QApplication(sys.argv)
+    """主程序入口；带子命令时只执行对应的命令行功能"""
+    parser = argparse.ArgumentParser(description="九域真形图 - 行政区沿革查询系统")
+    subparsers = parser.add_subparsers(dest="command")
+    convert_parser = subparsers.add_parser("convert-maps", help="convert map layers to FlatGeobuf with a spatial index")
+    convert_parser.add_argument("--force", action="store_true", help="convert even if the converted files are up to date")
+    # export-maps / build-tiles / serve 的参数由各自的脚本解析
+    subparsers.add_parser("export-maps", help="render every linked region's map to PNG/SVG (see export_maps.py)",
+                          add_help=False)
+    subparsers.add_parser("build-tiles", help="cut linked regions into vector tiles in an MBTiles file (see build_tiles.py)",
+                          add_help=False)
+    subparsers.add_parser("serve", help="serve region lookup, search and GeoJSON over local HTTP (see api_server.py)",
+                          add_help=False)
+    args, qt_args = parser.parse_known_args()
+    if args.command == "convert-maps":
+        sys.exit(0 if convert_maps(args.force) else 1)
+    if args.command == "export-maps":
+        import export_maps
+        sys.exit(export_maps.main(qt_args))
+    if args.command == "build-tiles":
+        import build_tiles
+        sys.exit(build_tiles.main(qt_args))
+    if args.command == "serve":
+        import api_server
+        sys.exit(api_server.main(qt_args))
+
+    app = QApplication([sys.argv[0]] + qt_args)
     app.setApplicationName("九域真形图")
     app.setApplicationVersion("1.0.0")
     
     # app.setWindowIcon(QIcon("icon.png")) # 如果有图标文件，可以取消注释
 
-    # print("正在加载数据...") # 移除调试打印
-    
-    # 加载和处理数据
-    processed_data = main_data_processing()
-    
-    # 加载国家边界数据
-    shapefiles = load_shapefiles()
-    country_gdf = shapefiles.get("country")
-    
-    if processed_data:
-        # print(f"数据加载成功 - 找到 {len(processed_data)} 个省级行政区") # 移除调试打印
-        pass
-    else:
-        print("警告: 数据加载失败或为空") # 仅保留必要的警告
+    # 先只加载国界，窗口立即显示；其余数据在后台线程中加载
+    country_gdf = get_geo_data_store().get("country")
     
     # 创建主窗口
-    main_window = MainWindow(processed_data, country_gdf)
+    main_window = MainWindow(None, country_gdf)
     main_window.show()
     
     # print("应用程序已启动") # 移除调试打印
@@ -952,4 +1147,6 @@ def main():
         sys.exit(0)
 
 if __name__ == "__main__":
+    # 打包后的 exe 中 export-maps / build-tiles 的进程池子进程会重新运行本入口，须先交给 multiprocessing 处理
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file